@@ -0,0 +1,24 @@
+import os
+
+# Con GUNICORN_WORKER_CLASS=gevent cada worker mantiene miles de conexiones
+# SSE inactivas (/api/changes/stream) con un coste mínimo. Con workers sync
+# /api/changes/stream responde 503 (ver SSE_ALLOW_SYNC_WORKERS).
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+
+def post_worker_init(worker):
+    if worker_class == "gevent":
+        # gRPC (Firestore) necesita cooperar con el bucle de gevent; debe hacerse
+        # después del monkey.patch_all() del worker, que ocurre tras post_fork
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+
+def worker_exit(server, worker):
+    # Vaciar las actualizaciones diferidas antes de que el worker termine
+    from src.services.write_behind import WriteBehindBuffer
+    WriteBehindBuffer.flush()
@@ -1,8 +1,12 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 from .config import Config
-from .routes import products_bp, categories_bp
+from .routes import products_bp, categories_bp, jobs_bp, changes_bp, admin_bp
 from .routes.auth import auth_bp
+from .middleware.compression import init_compression
+from .middleware.profiling import init_profiling
+from .services.replica import CatalogReplica
 
 load_dotenv()
 
@@ -11,10 +15,28 @@ def create_app():
     
     # Configuración
     app.config.from_object(Config)
+
+    # IP real del cliente tras los proxies de confianza (límites por IP)
+    if Config.PROXY_HOPS > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_HOPS)
     
     # Registrar Blueprints
     app.register_blueprint(products_bp, url_prefix='/api/products')
     app.register_blueprint(categories_bp, url_prefix='/api/categories')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(changes_bp, url_prefix='/api/changes')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+    # Compresión negociada de respuestas
+    init_compression(app)
+
+    # Perfilado bajo demanda y pilas de peticiones lentas (tras la compresión:
+    # los after_request se ejecutan en orden inverso)
+    init_profiling(app)
+
+    # Réplica del catálogo en memoria (opcional)
+    if Config.READ_REPLICA_ENABLED:
+        CatalogReplica.enable()
     
     return app
\ No newline at end of file
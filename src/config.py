@@ -2,4 +2,83 @@ import os
 
 class Config:
     FIREBASE_CREDENTIALS = os.environ.get("GOOGLE_CREDENTIALS_FILE")
-    PROJECT_ID = "product-shelf-app"
\ No newline at end of file
+    PROJECT_ID = "product-shelf-app"
+
+    # Importación masiva de productos (CSV / NDJSON)
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 500))
+    IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_BYTES", 512 * 1024 * 1024))
+    IMPORT_MAX_ROW_ERRORS = int(os.environ.get("IMPORT_MAX_ROW_ERRORS", 1000))
+    # Límite de Flask/Werkzeug para cualquier cuerpo: se rechaza antes de volcar el multipart a disco
+    MAX_CONTENT_LENGTH = IMPORT_MAX_BYTES + 1024 * 1024
+
+    # Feed de cambios (Server-Sent Events)
+    CHANGE_FEED_HISTORY = int(os.environ.get("CHANGE_FEED_HISTORY", 1000))
+    SSE_QUEUE_SIZE = int(os.environ.get("SSE_QUEUE_SIZE", 1000))
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+    SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", 3000))
+    SSE_ALLOW_SYNC_WORKERS = os.environ.get("SSE_ALLOW_SYNC_WORKERS", "false").lower() == "true"
+
+    # Cache HTTP (validadores ETag / Last-Modified)
+    CACHE_CONTROL_PRODUCT_LIST = os.environ.get("CACHE_CONTROL_PRODUCT_LIST", "private, no-cache")
+    CACHE_CONTROL_PRODUCT = os.environ.get("CACHE_CONTROL_PRODUCT", "private, max-age=5, must-revalidate")
+    CACHE_CONTROL_CATEGORY_LIST = os.environ.get("CACHE_CONTROL_CATEGORY_LIST", "private, max-age=30, must-revalidate")
+    CACHE_CONTROL_CATEGORY = os.environ.get("CACHE_CONTROL_CATEGORY", "private, max-age=30, must-revalidate")
+
+    # Compresión de respuestas
+    COMPRESSION_ENCODINGS = [e.strip() for e in os.environ.get("COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",") if e.strip()]
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 5))
+    COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", 3))
+    COMPRESSION_CACHE_BYTES = int(os.environ.get("COMPRESSION_CACHE_BYTES", 64 * 1024 * 1024))
+
+    # Control de admisión (límites por usuario/IP y descarte bajo sobrecarga)
+    ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_BUCKETS = int(os.environ.get("ADMISSION_MAX_BUCKETS", 10000))
+    ADMISSION_EXPENSIVE_COST = int(os.environ.get("ADMISSION_EXPENSIVE_COST", 10))
+    ADMISSION_BATCH_COST = int(os.environ.get("ADMISSION_BATCH_COST", 20))
+    RATE_LIMIT_USER_RATE = float(os.environ.get("RATE_LIMIT_USER_RATE", 20))
+    RATE_LIMIT_USER_BURST = float(os.environ.get("RATE_LIMIT_USER_BURST", 60))
+    RATE_LIMIT_IP_RATE = float(os.environ.get("RATE_LIMIT_IP_RATE", 40))
+    RATE_LIMIT_IP_BURST = float(os.environ.get("RATE_LIMIT_IP_BURST", 120))
+    SHED_QUEUE_SECONDS = float(os.environ.get("SHED_QUEUE_SECONDS", 1.0))
+    SHED_MAX_QUEUE_SECONDS = float(os.environ.get("SHED_MAX_QUEUE_SECONDS", 10.0))
+    SHED_LATENCY_SECONDS = float(os.environ.get("SHED_LATENCY_SECONDS", 2.0))
+    SHED_LATENCY_DECAY_SECONDS = float(os.environ.get("SHED_LATENCY_DECAY_SECONDS", 10.0))
+    # Proxies de confianza delante de la app (0 si se expone directamente)
+    PROXY_HOPS = int(os.environ.get("PROXY_HOPS", 1))
+
+    # Agrupación de lecturas concurrentes (single-flight) y micro-caché opcional
+    SINGLE_FLIGHT_TTL = float(os.environ.get("SINGLE_FLIGHT_TTL", 0))
+    SINGLE_FLIGHT_MAX_ENTRIES = int(os.environ.get("SINGLE_FLIGHT_MAX_ENTRIES", 1024))
+
+    # Operaciones masivas por filtro
+    BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+    BULK_MAX_IDS = int(os.environ.get("BULK_MAX_IDS", 10000))
+
+    # Lectura de varios productos por ID en una sola llamada
+    MULTI_GET_MAX_IDS = int(os.environ.get("MULTI_GET_MAX_IDS", 500))
+
+    # Escritura diferida (write-behind) de actualizaciones de productos
+    WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    WRITE_BEHIND_INTERVAL = float(os.environ.get("WRITE_BEHIND_INTERVAL", 1.0))
+    WRITE_BEHIND_MAX_DOCS = int(os.environ.get("WRITE_BEHIND_MAX_DOCS", 500))
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", 5))
+    WRITE_BEHIND_MAX_FLUSHES = int(os.environ.get("WRITE_BEHIND_MAX_FLUSHES", 5))
+    WRITE_BEHIND_DEAD_LETTER = int(os.environ.get("WRITE_BEHIND_DEAD_LETTER", 100))
+
+    # Réplica del catálogo en memoria de cada worker
+    READ_REPLICA_ENABLED = os.environ.get("READ_REPLICA_ENABLED", "false").lower() == "true"
+    REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 5.0))
+    # Sin señales del listener durante más tiempo se vuelve a leer de Firestore (0 desactiva)
+    REPLICA_MAX_SILENCE = float(os.environ.get("REPLICA_MAX_SILENCE", 120.0))
+
+    # Perfilado bajo demanda y captura de peticiones lentas
+    PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+    PROFILING_SAMPLE_INTERVAL = float(os.environ.get("PROFILING_SAMPLE_INTERVAL", 0.001))
+    PROFILING_TOP_FUNCTIONS = int(os.environ.get("PROFILING_TOP_FUNCTIONS", 60))
+    PROFILING_MAX_STACKS = int(os.environ.get("PROFILING_MAX_STACKS", 2000))
+    SLOW_REQUEST_SAMPLING = os.environ.get("SLOW_REQUEST_SAMPLING", "true").lower() == "true"
+    SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 1.0))
+    SLOW_REQUEST_SAMPLE_INTERVAL = float(os.environ.get("SLOW_REQUEST_SAMPLE_INTERVAL", 0.02))
+    SLOW_REQUEST_KEEP = int(os.environ.get("SLOW_REQUEST_KEEP", 20))
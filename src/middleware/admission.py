@@ -0,0 +1,186 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import current_app, g, jsonify, request
+
+from ..config import Config
+from ..services.auth import AuthService
+
+EXPENSIVE_FLAGS = ("include_category", "include_products")
+
+
+def admission_cost(cost: int):
+    """Declara el coste en tokens de una vista (por defecto 1)"""
+    def decorator(f):
+        f.admission_cost = cost
+        return f
+    return decorator
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        """Consume `cost` tokens; si no hay suficientes devuelve los segundos a esperar"""
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        return False, (cost - self.tokens) / rate
+
+
+class BucketTable:
+    """Buckets por clave (sujeto JWT o IP) con expulsión LRU para acotar memoria"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float) -> Tuple[bool, float]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.burst)
+                while len(self._buckets) > Config.ADMISSION_MAX_BUCKETS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            # Una petición más cara que la ráfaga completa nunca pasaría
+            return bucket.take(min(cost, self.burst), self.rate, self.burst)
+
+
+class LatencyTracker:
+    """
+    Media móvil exponencial de la latencia de las lecturas baratas (dominada
+    por Firestore). Decae con el tiempo de reloj: sin muestras nuevas la
+    señal de sobrecarga se apaga sola en lugar de quedarse fija.
+    """
+
+    def __init__(self, alpha: float = 0.2, decay_seconds: float = 10.0):
+        self.alpha = alpha
+        self.decay_seconds = decay_seconds
+        self._value = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _decayed(self, now: float) -> float:
+        return self._value * math.exp(-(now - self._updated) / self.decay_seconds)
+
+    @property
+    def value(self) -> float:
+        with self._lock:
+            return self._decayed(time.monotonic())
+
+    def record(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._value = self.alpha * seconds + (1 - self.alpha) * self._decayed(now)
+            self._updated = now
+
+
+class AdmissionController:
+    users = BucketTable(Config.RATE_LIMIT_USER_RATE, Config.RATE_LIMIT_USER_BURST)
+    ips = BucketTable(Config.RATE_LIMIT_IP_RATE, Config.RATE_LIMIT_IP_BURST)
+    latency = LatencyTracker(decay_seconds=Config.SHED_LATENCY_DECAY_SECONDS)
+
+    @staticmethod
+    def request_cost() -> int:
+        view = current_app.view_functions.get(request.endpoint)
+        cost = getattr(view, "admission_cost", 1)
+        if any(request.args.get(flag, "false").lower() == "true" for flag in EXPENSIVE_FLAGS):
+            cost = max(cost, Config.ADMISSION_EXPENSIVE_COST)
+        # Lectura múltiple por ?ids=: mismo coste que POST /batch-get
+        if request.args.get("ids"):
+            cost = max(cost, Config.ADMISSION_EXPENSIVE_COST)
+        return cost
+
+    @staticmethod
+    def subject() -> Optional[str]:
+        """Sujeto del JWT si es válido; la validación real la sigue haciendo require_jwt"""
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            return None
+        try:
+            return AuthService.verify_token(auth_header.split(" ")[1]).get("email")
+        except ValueError:
+            return None
+
+    @staticmethod
+    def queue_time() -> Optional[float]:
+        """Segundos que la petición esperó en el proxy/cola (cabecera X-Request-Start)"""
+        header = request.headers.get("X-Request-Start")
+        if not header:
+            return None
+        try:
+            started = float(header.replace("t=", "").strip())
+        except ValueError:
+            return None
+        # El proxy puede enviar segundos, milisegundos o microsegundos
+        if started > 1e14:
+            started /= 1_000_000
+        elif started > 1e11:
+            started /= 1000
+        return max(0.0, time.time() - started)
+
+    @classmethod
+    def overloaded(cls) -> bool:
+        queue_time = cls.queue_time() or 0.0
+        return queue_time > Config.SHED_QUEUE_SECONDS or cls.latency.value > Config.SHED_LATENCY_SECONDS
+
+    @classmethod
+    def admit(cls):
+        g.admission_started = time.monotonic()
+        if not Config.ADMISSION_ENABLED:
+            return None
+
+        cost = g.admission_cost = cls.request_cost()
+
+        # Descarte temprano: bajo sobrecarga solo se atienden peticiones baratas
+        queue_time = cls.queue_time()
+        if queue_time is not None and queue_time > Config.SHED_MAX_QUEUE_SECONDS:
+            return cls._reject(503, "Servidor sobrecargado, intente más tarde", 1.0)
+        if cost > 1 and cls.overloaded():
+            return cls._reject(503, "Servidor sobrecargado, intente más tarde", 1.0)
+
+        subject = cls.subject()
+        if subject:
+            allowed, retry_after = cls.users.take(subject, cost)
+            if not allowed:
+                return cls._reject(429, "Límite de peticiones excedido", retry_after)
+        # remote_addr ya viene corregido por ProxyFix (PROXY_HOPS); la entrada
+        # más a la izquierda de X-Forwarded-For la controla el cliente
+        allowed, retry_after = cls.ips.take(request.remote_addr or "unknown", cost)
+        if not allowed:
+            return cls._reject(429, "Límite de peticiones excedido", retry_after)
+        return None
+
+    @staticmethod
+    def _reject(status: int, message: str, retry_after: float):
+        return jsonify({"error": message}), status, {"Retry-After": str(max(1, int(retry_after + 0.999)))}
+
+    @classmethod
+    def record(cls, response):
+        # Solo las lecturas baratas: las subidas grandes (import/batch) y las
+        # consultas include_* son justo lo que se descarta y distorsionarían la media
+        started = g.get("admission_started")
+        cheap = g.get("admission_cost", 1) <= 1
+        if started is not None and cheap and request.method == "GET" and response.status_code not in (429, 503):
+            cls.latency.record(time.monotonic() - started)
+        return response
+
+
+def init_admission(blueprint):
+    """Aplica el control de admisión a todas las rutas de un blueprint"""
+    blueprint.before_request(AdmissionController.admit)
+    blueprint.after_request(AdmissionController.record)
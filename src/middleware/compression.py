@@ -0,0 +1,149 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import Response, request
+
+from ..config import Config
+
+# brotli y zstandard son opcionales; sin ellos se negocia solo gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"}
+
+
+def available_encodings():
+    encodings = []
+    for encoding in Config.COMPRESSION_ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        if encoding == "zstd" and zstandard is None:
+            continue
+        encodings.append(encoding)
+    return encodings
+
+
+def negotiate_encoding() -> Optional[str]:
+    """Primer algoritmo soportado (en orden de preferencia del servidor) que acepta el cliente"""
+    for encoding in available_encodings():
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=Config.COMPRESSION_ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=Config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    """Cada codificación es una representación distinta y necesita su propio ETag fuerte"""
+    return f"{etag}-{encoding}"
+
+
+class CompressedBodyCache:
+    """
+    LRU acotado en bytes con los cuerpos ya comprimidos, indexado por
+    (ruta, ETag, codificación). Como el ETag cambia con los datos, cada
+    versión se comprime una sola vez y las antiguas salen por LRU.
+    """
+    _entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+    _size = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key) -> Optional[bytes]:
+        with cls._lock:
+            body = cls._entries.get(key)
+            if body is not None:
+                cls._entries.move_to_end(key)
+            return body
+
+    @classmethod
+    def put(cls, key, body: bytes):
+        if len(body) > Config.COMPRESSION_CACHE_BYTES:
+            return
+        with cls._lock:
+            previous = cls._entries.pop(key, None)
+            if previous is not None:
+                cls._size -= len(previous)
+            cls._entries[key] = body
+            cls._size += len(body)
+            while cls._size > Config.COMPRESSION_CACHE_BYTES:
+                _, evicted = cls._entries.popitem(last=False)
+                cls._size -= len(evicted)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._size = 0
+
+
+def cached_response(etag: str) -> Optional[Response]:
+    """
+    Respuesta precomprimida para la versión `etag` de la ruta actual, si existe.
+    Permite contestar sin reconstruir ni volver a serializar el listado.
+    """
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return None
+    body = CompressedBodyCache.get((request.full_path, etag, encoding))
+    if body is None:
+        return None
+    response = Response(body, mimetype="application/json")
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(variant_etag(etag, encoding))
+    return response
+
+
+def init_compression(app):
+    """Registra la compresión negociada (br / zstd / gzip) de las respuestas"""
+
+    @app.after_request
+    def compress_response(response):
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        if "Content-Encoding" in response.headers:
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if response.content_length is not None and response.content_length < Config.COMPRESSION_MIN_SIZE:
+            return response
+
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        cache_key = (request.full_path, etag, encoding) if etag and not weak else None
+        body = CompressedBodyCache.get(cache_key) if cache_key else None
+        if body is None:
+            raw = response.get_data()
+            if len(raw) < Config.COMPRESSION_MIN_SIZE:
+                return response
+            body = compress(raw, encoding)
+            if cache_key:
+                CompressedBodyCache.put(cache_key, body)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(variant_etag(etag, encoding), weak)
+        return response
@@ -0,0 +1,51 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from flask import Response, jsonify, request
+
+from .compression import available_encodings, cached_response, variant_etag
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag fuerte a partir de las versiones de los documentos/colecciones involucrados"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def etag_variants(etag: str) -> List[str]:
+    return [etag] + [variant_etag(etag, encoding) for encoding in available_encodings()]
+
+
+def is_fresh(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """True si la copia del cliente sigue vigente (If-None-Match / If-Modified-Since)"""
+    if request.if_none_match:
+        # El cliente puede tener la variante comprimida (<etag>-gzip, <etag>-br, ...)
+        return any(request.if_none_match.contains(candidate) for candidate in etag_variants(etag))
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def conditional_json(etag: str, last_modified: Optional[datetime], cache_control: str,
+                     build_payload: Callable[[], Any], serialized: bool = False) -> Response:
+    """
+    Responde 304 sin construir ni serializar el cuerpo si el cliente ya tiene
+    esta versión; en otro caso construye el JSON y le añade los validadores.
+    Con `serialized=True`, build_payload devuelve directamente el texto JSON.
+    """
+    if is_fresh(etag, last_modified):
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        response = cached_response(etag)
+        if response is None:
+            if serialized:
+                response = Response(build_payload(), mimetype="application/json")
+            else:
+                response = jsonify(build_payload())
+            response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
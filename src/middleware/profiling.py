@@ -0,0 +1,268 @@
+import cProfile
+import heapq
+import hmac
+import io
+import itertools
+import logging
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from flask import Response, g, jsonify, request
+
+from ..config import Config
+from ..services.auth import AuthService
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = ("cprofile", "collapsed")
+PROFILE_SORTS = ("cumulative", "tottime", "calls")
+
+
+def collapse_stack(frame) -> str:
+    """Pila en formato 'collapsed' (raíz primero, separada por ';') para flamegraph.pl / speedscope"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def _greenlets() -> bool:
+    # Con workers gevent cada petición es un greenlet del mismo hilo del sistema
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+
+class RequestTrace:
+    """Una petición en curso o terminada con las pilas muestreadas durante su ejecución"""
+    __slots__ = ("id", "method", "path", "thread_id", "greenlet", "profile", "started",
+                 "started_at", "duration", "status", "samples")
+
+    def __init__(self, trace_id: int, profile: bool = False):
+        self.id = trace_id
+        self.method = request.method
+        self.path = request.full_path.rstrip("?")
+        self.thread_id = threading.get_ident()
+        self.greenlet = None
+        if _greenlets():
+            import greenlet
+            self.greenlet = greenlet.getcurrent()
+        self.profile = profile
+        self.started = time.monotonic()
+        self.started_at = time.time()
+        self.duration = None
+        self.status = None
+        self.samples = Counter()
+
+    def frame(self, frames: Dict):
+        if self.greenlet is not None:
+            return self.greenlet.gr_frame
+        return frames.get(self.thread_id)
+
+    def add_sample(self, stack: str):
+        if stack in self.samples or len(self.samples) < Config.PROFILING_MAX_STACKS:
+            self.samples[stack] += 1
+        else:
+            self.samples["[otras pilas]"] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def to_dict(self, top: int = 0) -> Dict:
+        trace_data = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": round(self.duration, 4) if self.duration is not None else None,
+            "samples": sum(self.samples.values()),
+        }
+        if top:
+            trace_data["top_stacks"] = [
+                {"stack": stack, "count": count} for stack, count in self.samples.most_common(top)
+            ]
+        return trace_data
+
+
+class StackSampler:
+    """
+    Muestreador de pilas de bajo coste: un hilo toma cada
+    SLOW_REQUEST_SAMPLE_INTERVAL segundos la pila de cada petición en curso
+    (sys._current_frames, o el frame del greenlet con gevent). Al terminar,
+    las peticiones que superan SLOW_REQUEST_SECONDS se guardan con sus pilas
+    entre las SLOW_REQUEST_KEEP más lentas; el resto se descarta.
+    """
+    _lock = threading.Lock()
+    _active: Dict[int, RequestTrace] = {}
+    _slowest: List = []
+    _ids = itertools.count(1)
+    _thread = None
+
+    @classmethod
+    def _ensure_started(cls):
+        if cls._thread is None or not cls._thread.is_alive():
+            with cls._lock:
+                if cls._thread is None or not cls._thread.is_alive():
+                    cls._thread = threading.Thread(target=cls._loop, name="stack-sampler", daemon=True)
+                    cls._thread.start()
+
+    @classmethod
+    def _loop(cls):
+        while True:
+            with cls._lock:
+                traces = list(cls._active.values())
+            # Una petición perfilada bajo demanda se muestrea con más resolución
+            profiling = any(trace.profile for trace in traces)
+            time.sleep(Config.PROFILING_SAMPLE_INTERVAL if profiling else Config.SLOW_REQUEST_SAMPLE_INTERVAL)
+            if traces:
+                try:
+                    cls._sample()
+                except Exception as e:
+                    logger.error(f"Error muestreando pilas: {str(e)}")
+
+    @classmethod
+    def _sample(cls):
+        frames = {} if _greenlets() else sys._current_frames()
+        with cls._lock:
+            traces = list(cls._active.values())
+        for trace in traces:
+            frame = trace.frame(frames)
+            if frame is not None:
+                trace.add_sample(collapse_stack(frame))
+
+    @classmethod
+    def begin(cls, profile: bool = False) -> RequestTrace:
+        cls._ensure_started()
+        trace = RequestTrace(next(cls._ids), profile)
+        with cls._lock:
+            cls._active[id(trace)] = trace
+        return trace
+
+    @classmethod
+    def end(cls, trace: RequestTrace, status: Optional[int] = None, keep: bool = True):
+        with cls._lock:
+            if cls._active.pop(id(trace), None) is None:
+                return
+            trace.duration = time.monotonic() - trace.started
+            trace.status = status
+            if not keep or trace.profile or trace.duration < Config.SLOW_REQUEST_SECONDS:
+                return
+            entry = (trace.duration, trace.id, trace)
+            if len(cls._slowest) < Config.SLOW_REQUEST_KEEP:
+                heapq.heappush(cls._slowest, entry)
+            elif entry > cls._slowest[0]:
+                heapq.heapreplace(cls._slowest, entry)
+
+    @classmethod
+    def slowest(cls) -> List[RequestTrace]:
+        with cls._lock:
+            return [trace for _, _, trace in sorted(cls._slowest, reverse=True)]
+
+    @classmethod
+    def get(cls, trace_id: int) -> Optional[RequestTrace]:
+        with cls._lock:
+            for _, _, trace in cls._slowest:
+                if trace.id == trace_id:
+                    return trace
+        return None
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._slowest = []
+
+
+def profile_allowed() -> bool:
+    """Perfilar exige la cabecera X-Profile-Token o un JWT con rol 'admin'"""
+    token = request.headers.get("X-Profile-Token")
+    if token and Config.PROFILING_TOKEN and hmac.compare_digest(token, Config.PROFILING_TOKEN):
+        return True
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return False
+    try:
+        return AuthService.verify_token(auth_header.split(" ")[1]).get("role") == "admin"
+    except ValueError:
+        return False
+
+
+def _profile_response(response, trace: RequestTrace, profiler: Optional[cProfile.Profile]) -> Response:
+    if profiler is not None:
+        stream = io.StringIO()
+        sort = request.args.get("_profile_sort", "cumulative")
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(sort if sort in PROFILE_SORTS else "cumulative").print_stats(Config.PROFILING_TOP_FUNCTIONS)
+        body = stream.getvalue()
+    else:
+        body = trace.collapsed()
+    profiled = Response(body, mimetype="text/plain")
+    profiled.headers["X-Profile-Status"] = str(response.status_code)
+    profiled.headers["X-Profile-Duration"] = f"{trace.duration:.4f}"
+    profiled.headers["Cache-Control"] = "no-store"
+    return profiled
+
+
+def init_profiling(app):
+    """
+    Registra el perfilado de peticiones:
+    - Bajo demanda (cabecera X-Profile o ?_profile=cprofile|collapsed, solo
+      administradores): la respuesta se sustituye por las estadísticas de
+      cProfile o por las pilas en formato collapsed para un flamegraph.
+    - Siempre activo (SLOW_REQUEST_SAMPLING): pilas muestreadas de las
+      peticiones lentas, consultables en /api/admin/profiling/slow.
+    """
+
+    @app.before_request
+    def start_profiling():
+        mode = request.headers.get("X-Profile") or request.args.get("_profile")
+        if mode:
+            if mode not in PROFILE_FORMATS:
+                return jsonify({"error": f"Formato de perfil no soportado, use: {', '.join(PROFILE_FORMATS)}"}), 400
+            if not profile_allowed():
+                return jsonify({"error": "Perfilado no autorizado"}), 403
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Solo puede haber un perfilador activo por hilo (con gevent, por worker)
+                    return jsonify({"error": "Ya hay un perfilado en curso, intente más tarde"}), 409
+                g.profiler = profiler
+            g.profile_trace = StackSampler.begin(profile=True)
+        elif Config.SLOW_REQUEST_SAMPLING:
+            g.profile_trace = StackSampler.begin()
+
+    @app.after_request
+    def finish_profiling(response):
+        trace = g.pop("profile_trace", None)
+        if trace is None:
+            return response
+        # Los streams (SSE) duran lo que dure la conexión: no son peticiones lentas
+        StackSampler.end(trace, response.status_code, keep=not response.is_streamed)
+        if not trace.profile:
+            return response
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+        return _profile_response(response, trace, profiler)
+
+    @app.teardown_request
+    def discard_trace(exc):
+        # Peticiones que terminaron con una excepción no capturada
+        trace = g.pop("profile_trace", None)
+        if trace is not None:
+            StackSampler.end(trace, 500)
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
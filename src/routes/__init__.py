@@ -1,4 +1,7 @@
 from .products import products_bp
 from .categories import categories_bp
+from .jobs import jobs_bp
+from .changes import changes_bp
+from .admin import admin_bp
 
-__all__ = ['products_bp', 'categories_bp']
\ No newline at end of file
+__all__ = ['products_bp', 'categories_bp', 'jobs_bp', 'changes_bp', 'admin_bp']
\ No newline at end of file
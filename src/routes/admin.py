@@ -0,0 +1,45 @@
+from flask import Blueprint, Response, jsonify, request
+from src.middleware.profiling import StackSampler
+from src.services.auth import require_jwt, require_admin
+from src.config import Config
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/profiling/slow', methods=['GET'])
+@require_jwt
+@require_admin
+def get_slow_requests():
+    try:
+        return jsonify({
+            "sampling": Config.SLOW_REQUEST_SAMPLING,
+            "threshold_seconds": Config.SLOW_REQUEST_SECONDS,
+            "sample_interval": Config.SLOW_REQUEST_SAMPLE_INTERVAL,
+            "requests": [trace.to_dict() for trace in StackSampler.slowest()]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/profiling/slow/<int:trace_id>', methods=['GET'])
+@require_jwt
+@require_admin
+def get_slow_request(trace_id):
+    try:
+        trace = StackSampler.get(trace_id)
+        if trace is None:
+            return jsonify({"error": "Petición no encontrada"}), 404
+        # format=collapsed devuelve las pilas listas para flamegraph.pl / speedscope
+        if request.args.get('format') == 'collapsed':
+            return Response(trace.collapsed(), mimetype="text/plain")
+        return jsonify(trace.to_dict(top=request.args.get('top', 20, type=int))), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/profiling/slow', methods=['DELETE'])
+@require_jwt
+@require_admin
+def clear_slow_requests():
+    try:
+        StackSampler.clear()
+        return jsonify({"message": "Registro de peticiones lentas vaciado"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
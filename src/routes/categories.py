@@ -1,17 +1,55 @@
 from flask import Blueprint, request, jsonify
 from src.services.product_service import CategoryService
+from src.services.replica import CatalogReplica
+from src.services.models import dumps_list
+from src.services.sync import SyncService, DEFAULT_PAGE_SIZE
+from src.services.schemas import parse_timestamp
+from src.middleware.conditional import conditional_json, make_etag
+from src.config import Config
+from src.middleware.admission import init_admission
 from werkzeug.exceptions import BadRequest, NotFound
 from src.services.auth import require_jwt
 
 categories_bp = Blueprint('categories', __name__)
+init_admission(categories_bp)
 
 @categories_bp.route('/', methods=['GET'])
 @require_jwt
 def get_categories():
     try:
+        updated_since = request.args.get('updated_since')
+        if updated_since:
+            changes = SyncService.changes_since(
+                "categories",
+                parse_timestamp(updated_since),
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+            )
+            return jsonify(changes), 200
+
         include_products = request.args.get('include_products', 'false').lower() == 'true'
-        categories = CategoryService.get_all(include_products=include_products)
-        return jsonify(categories), 200
+
+        # Con la réplica en memoria al día no se lee Firestore en absoluto
+        from_replica = CatalogReplica.usable()
+        if from_replica:
+            collections = ("categories", "products") if include_products else ("categories",)
+            version, _ = CatalogReplica.collection_version(*collections)
+            load = lambda: CatalogReplica.list_categories(include_products)
+        else:
+            version, _ = CategoryService.collection_version(include_products)
+            load = lambda: dumps_list(CategoryService.get_all(include_products=include_products))
+        response = conditional_json(
+            make_etag("categories", version, include_products),
+            # Sin Last-Modified: los borrados no mueven el updated_at más reciente,
+            # y un If-Modified-Since devolvería 304 con filas ya eliminadas
+            None,
+            Config.CACHE_CONTROL_CATEGORY_LIST,
+            load,
+            serialized=True
+        )
+        return CatalogReplica.annotate(response) if from_replica else response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -52,10 +90,25 @@ def create_category():
 @require_jwt
 def get_category(category_id):
     try:
-        category = CategoryService.get_by_id(category_id)
-        if not category:
+        entry = CatalogReplica.get_category(category_id) if CatalogReplica.usable() else None
+        if entry is not None:
+            category, update_time = entry
+            return CatalogReplica.annotate(conditional_json(
+                make_etag(f"categories/{category_id}", update_time),
+                update_time,
+                Config.CACHE_CONTROL_CATEGORY,
+                lambda: category
+            ))
+
+        doc = CategoryService.get_snapshot(category_id)
+        if doc is None:
             raise NotFound("Categoría no encontrada")
-        return jsonify(category), 200
+        return conditional_json(
+            make_etag(doc.reference.path, doc.update_time),
+            doc.update_time,
+            Config.CACHE_CONTROL_CATEGORY,
+            lambda: CategoryService.from_snapshot(doc)
+        )
     except NotFound as e:
         return jsonify({"error": str(e)}), 404
     except Exception as e:
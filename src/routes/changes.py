@@ -0,0 +1,60 @@
+import queue
+from flask import Blueprint, Response, request, jsonify
+from src.config import Config
+from src.services.change_feed import ChangeFeed, WATCHED_COLLECTIONS, streaming_supported
+from src.services.auth import require_jwt
+
+changes_bp = Blueprint('changes', __name__)
+
+@changes_bp.route('/stream', methods=['GET'])
+@require_jwt
+def stream_changes():
+    """Server-Sent Events con los cambios de productos y categorías"""
+    try:
+        if not streaming_supported():
+            return jsonify({
+                "error": "El streaming requiere workers gevent (GUNICORN_WORKER_CLASS=gevent)"
+            }), 503
+
+        requested = request.args.get('collections', ','.join(WATCHED_COLLECTIONS))
+        collections = [c.strip() for c in requested.split(',') if c.strip()]
+        invalid = [c for c in collections if c not in WATCHED_COLLECTIONS]
+        if invalid or not collections:
+            return jsonify({"error": f"Colecciones no soportadas: {', '.join(invalid) or requested}"}), 400
+
+        category_id = request.args.get('category_id') or None
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        subscription, replay = ChangeFeed.subscribe(collections, category_id, last_event_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def generate():
+        try:
+            yield f"retry: {Config.SSE_RETRY_MS}\n\n"
+            if replay is None:
+                # El punto de reanudación ya no está en el historial: el cliente debe recargar
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                for event in replay:
+                    yield event.to_sse()
+            while True:
+                if subscription.overflowed:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                try:
+                    event = subscription.queue.get(timeout=Config.SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    # Sustituye listeners caídos (y pide reset a sus clientes)
+                    ChangeFeed.ensure_started()
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    continue
+                yield event.to_sse()
+        finally:
+            ChangeFeed.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify
+from src.services.jobs import JobRegistry
+from src.services.auth import require_jwt
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@require_jwt
+def get_job(job_id):
+    try:
+        job = JobRegistry.get(job_id)
+        if not job:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,21 +1,101 @@
 from flask import Blueprint, request, jsonify
 from src.services.product_service import ProductService
+from src.services.import_service import ImportService
+from src.services.bulk_service import BulkService
+from src.services.write_behind import WriteBehindBuffer, BufferFullError
+from src.services.replica import CatalogReplica
+from src.services.models import dumps_list
+from src.services.sync import SyncService, DEFAULT_PAGE_SIZE
+from src.services.schemas import parse_timestamp
+from src.middleware.conditional import conditional_json, make_etag
+from src.config import Config
+from src.middleware.admission import init_admission, admission_cost
 from werkzeug.exceptions import BadRequest
 from src.services.auth import require_jwt
 from typing import List, Dict
 
 products_bp = Blueprint('products', __name__)
+init_admission(products_bp)
 
 @products_bp.route('/', methods=['GET'])
 @require_jwt
 def get_products():
     try:
+        updated_since = request.args.get('updated_since')
+        if updated_since:
+            changes = SyncService.changes_since(
+                "products",
+                parse_timestamp(updated_since),
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+            )
+            return jsonify(changes), 200
+
         include_category = request.args.get('include_category', 'false').lower() == 'true'
-        products = ProductService.get_all(include_category=include_category)
-        return jsonify(products), 200
+        ids = request.args.get('ids')
+        if ids is not None:
+            return jsonify(get_many([i.strip() for i in ids.split(',') if i.strip()], include_category)), 200
+
+        category_id = request.args.get('category_id') or None
+        sort = request.args.get('sort') or None
+        if sort not in (None, 'price'):
+            return jsonify({"error": "Orden no soportado, use sort=price"}), 400
+
+        # Con la réplica en memoria al día no se lee Firestore en absoluto
+        from_replica = CatalogReplica.usable()
+        if from_replica:
+            collections = ("products", "categories") if include_category else ("products",)
+            version, _ = CatalogReplica.collection_version(*collections)
+            load = lambda: CatalogReplica.list_products(include_category, category_id, sort)
+        else:
+            version, _ = ProductService.collection_version(include_category)
+            load = lambda: dumps_list(ProductService.get_all(include_category, category_id, sort),
+                                      include_category=include_category)
+        response = conditional_json(
+            make_etag("products", version, include_category, category_id, sort),
+            # Sin Last-Modified: los borrados no mueven el updated_at más reciente,
+            # y un If-Modified-Since devolvería 304 con filas ya eliminadas
+            None,
+            Config.CACHE_CONTROL_PRODUCT_LIST,
+            load,
+            serialized=True
+        )
+        return CatalogReplica.annotate(response) if from_replica else response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/batch-get', methods=['POST'])
+@admission_cost(Config.ADMISSION_EXPENSIVE_COST)
+@require_jwt
+def batch_get_products():
+    """Varios productos por ID en una sola petición (carrito, favoritos)"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data, dict):
+            return jsonify({"error": "Datos vacíos o formato incorrecto"}), 400
+        include_category = bool(data.get("include_category", False))
+        return jsonify(get_many(data.get("ids"), include_category)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def get_many(ids, include_category: bool) -> Dict:
+    """Resultados en el orden pedido; los IDs inexistentes se marcan con `missing`"""
+    ids = ProductService.parse_ids(ids)
+    if CatalogReplica.usable():
+        products = CatalogReplica.get_many(ids, include_category)
+    else:
+        products = ProductService.get_many(ids, include_category)
+    return {
+        "products": products,
+        "missing": [product["id"] for product in products if product.get("missing")]
+    }
+
 @products_bp.route('/', methods=['POST'])
 @require_jwt
 def create_product():
@@ -59,10 +139,25 @@ def create_product():
 def get_product_by_id(product_id):
     try:
         include_category = request.args.get('include_category', 'false').lower() == 'true'
-        product = ProductService.get_by_id(product_id, include_category=include_category)
-        if not product:
+        entry = CatalogReplica.get_product(product_id, include_category) if CatalogReplica.usable() else None
+        if entry is not None:
+            product, update_time = entry
+            return CatalogReplica.annotate(conditional_json(
+                make_etag(f"products/{product_id}", update_time, include_category),
+                update_time,
+                Config.CACHE_CONTROL_PRODUCT,
+                lambda: product
+            ))
+
+        doc = ProductService.get_snapshot(product_id)
+        if doc is None:
             return jsonify({"error": "Producto no encontrado"}), 404
-        return jsonify(product), 200
+        return conditional_json(
+            make_etag(doc.reference.path, doc.update_time, include_category),
+            doc.update_time,
+            Config.CACHE_CONTROL_PRODUCT,
+            lambda: ProductService.from_snapshot(doc, include_category)
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -77,6 +172,17 @@ def update_product(product_id):
         if not data or not isinstance(data, dict):
             return jsonify({"error": "Datos vacíos o formato incorrecto, se esperaba un objeto JSON"}), 400
 
+        # Modo opcional de escritura diferida: acepta cambios parciales y responde al instante
+        if request.args.get('write_behind', 'false').lower() == 'true':
+            if not Config.WRITE_BEHIND_ENABLED:
+                return jsonify({"error": "La escritura diferida no está habilitada"}), 400
+            pending_fields = WriteBehindBuffer.enqueue(product_id, data)
+            return jsonify({
+                "message": "Actualización aceptada",
+                "id": product_id,
+                "pending_fields": pending_fields
+            }), 202
+
         # Validar campos requeridos
         required_fields = ["name", "price", "category_id"]
         missing_fields = [field for field in required_fields if field not in data]
@@ -93,6 +199,8 @@ def update_product(product_id):
 
         updated_product = ProductService.update(product_id, data)
         return jsonify(updated_product), 200
+    except BufferFullError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except BadRequest as e:
@@ -112,6 +220,7 @@ def delete_product(product_id):
         return jsonify({"error": str(e)}), 500
 
 @products_bp.route('/seed', methods=['POST'])
+@admission_cost(Config.ADMISSION_BATCH_COST)
 def seed_products():
     """Endpoint para poblar la base de datos con productos de ejemplo"""
     try:
@@ -125,6 +234,7 @@ def seed_products():
         return jsonify({"error": str(e)}), 500
 
 @products_bp.route('/batch', methods=['POST'])
+@admission_cost(Config.ADMISSION_BATCH_COST)
 @require_jwt
 def create_batch_products():
     """Endpoint para crear múltiples productos"""
@@ -141,4 +251,100 @@ def create_batch_products():
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/import', methods=['POST'])
+@admission_cost(Config.ADMISSION_BATCH_COST)
+@require_jwt
+def import_products():
+    """Importa productos desde un archivo CSV o NDJSON en segundo plano"""
+    try:
+        if request.content_length is not None and request.content_length > Config.IMPORT_MAX_BYTES:
+            return jsonify({"error": f"El archivo supera el máximo de {Config.IMPORT_MAX_BYTES} bytes"}), 413
+
+        upload = request.files.get('file')
+        filename = upload.filename if upload else ''
+        fmt = request.args.get('format')
+        if not fmt:
+            content_type = (upload.mimetype if upload else request.mimetype) or ''
+            if 'csv' in content_type or filename.endswith('.csv'):
+                fmt = 'csv'
+            elif 'ndjson' in content_type or 'jsonl' in content_type or filename.endswith(('.ndjson', '.jsonl')):
+                fmt = 'ndjson'
+            else:
+                raise BadRequest("No se pudo determinar el formato, use ?format=csv o ?format=ndjson")
+
+        stream = upload.stream if upload else request.stream
+        path = ImportService.spool_upload(stream)
+        job = ImportService.start(path, fmt.lower())
+        return jsonify({
+            "message": "Importación iniciada",
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/bulk-update', methods=['POST'])
+@admission_cost(Config.ADMISSION_BATCH_COST)
+@require_jwt
+def bulk_update_products():
+    """Actualiza en segundo plano todos los productos que cumplen un filtro"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data, dict):
+            return jsonify({"error": "Datos vacíos o formato incorrecto"}), 400
+
+        filters = BulkService.parse_filter(data.get("filter"))
+        update = BulkService.parse_update(data.get("update"))
+        dry_run = bool(data.get("dry_run", False))
+        job = BulkService.start_update(filters, update, dry_run=dry_run)
+        return jsonify({
+            "message": "Actualización masiva iniciada",
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/bulk-delete', methods=['POST'])
+@admission_cost(Config.ADMISSION_BATCH_COST)
+@require_jwt
+def bulk_delete_products():
+    """Elimina en segundo plano todos los productos que cumplen un filtro"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data, dict):
+            return jsonify({"error": "Datos vacíos o formato incorrecto"}), 400
+
+        filters = BulkService.parse_filter(data.get("filter"))
+        dry_run = bool(data.get("dry_run", False))
+        job = BulkService.start_delete(filters, dry_run=dry_run)
+        return jsonify({
+            "message": "Borrado masivo iniciado",
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}"
+        }), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/write-behind/stats', methods=['GET'])
+@require_jwt
+def write_behind_stats():
+    """Métricas del buffer de escritura diferida de este worker"""
+    try:
+        return jsonify(WriteBehindBuffer.stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
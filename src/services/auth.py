@@ -53,6 +53,7 @@ class AuthService:
             raise ValueError('Usuario o contraseña incorrectos')
         payload = {
             'email': email,
+            'role': user.get('role', 'user'),
             'exp': datetime.utcnow() + timedelta(seconds=JWT_EXP_DELTA_SECONDS)
         }
         token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -81,4 +82,14 @@ def require_jwt(f):
         except Exception as e:
             return {'error': str(e)}, 401
         return f(*args, **kwargs)
-    return decorated 
\ No newline at end of file
+    return decorated 
+
+def require_admin(f):
+    """Usar después de require_jwt: solo usuarios con rol 'admin' en el token"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        user = getattr(request, 'user', None) or {}
+        if user.get('role') != 'admin':
+            return {'error': 'Se requiere rol de administrador'}, 403
+        return f(*args, **kwargs)
+    return decorated
\ No newline at end of file
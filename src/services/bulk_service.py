@@ -0,0 +1,238 @@
+import logging
+from typing import Dict, Iterator, List
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from ..config import Config
+from .jobs import Job, JobRegistry
+from .product_service import ProductService
+from .singleflight import CommitTimes, read_flight
+from .sync import record_tombstone
+
+logger = logging.getLogger(__name__)
+
+SETTABLE_FIELDS = ("name", "price", "category_id", "description")
+MULTIPLIABLE_FIELDS = ("price",)
+DRY_RUN_SAMPLE_SIZE = 20
+
+
+class BulkService:
+    """Actualización y borrado masivo de productos a partir de un filtro"""
+
+    @classmethod
+    def parse_filter(cls, data) -> Dict:
+        """Valida el filtro: category_id, price_min, price_max y/o ids"""
+        if not isinstance(data, dict) or not data:
+            raise ValueError("Se requiere un filtro (category_id, price_min, price_max o ids)")
+        unknown = set(data) - {"category_id", "price_min", "price_max", "ids"}
+        if unknown:
+            raise ValueError(f"Campos de filtro no soportados: {', '.join(sorted(unknown))}")
+        filters = {}
+        if "category_id" in data:
+            if not isinstance(data["category_id"], str) or not data["category_id"]:
+                raise ValueError("category_id debe ser un string")
+            filters["category_id"] = data["category_id"]
+        for bound in ("price_min", "price_max"):
+            if bound in data:
+                if not isinstance(data[bound], (int, float)) or isinstance(data[bound], bool):
+                    raise ValueError(f"{bound} debe ser numérico")
+                filters[bound] = data[bound]
+        if "ids" in data:
+            ids = data["ids"]
+            if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i for i in ids):
+                raise ValueError("ids debe ser una lista de strings no vacía")
+            if len(ids) > Config.BULK_MAX_IDS:
+                raise ValueError(f"Máximo {Config.BULK_MAX_IDS} ids por operación")
+            filters["ids"] = list(dict.fromkeys(ids))
+        return filters
+
+    @classmethod
+    def parse_update(cls, data) -> Dict:
+        """Valida la expresión de actualización: {"set": {...}, "multiply": {"price": factor}}"""
+        if not isinstance(data, dict) or not data:
+            raise ValueError("Se requiere una actualización ('set' y/o 'multiply')")
+        unknown = set(data) - {"set", "multiply"}
+        if unknown:
+            raise ValueError(f"Operaciones no soportadas: {', '.join(sorted(unknown))}")
+
+        to_set = data.get("set", {})
+        to_multiply = data.get("multiply", {})
+        if not isinstance(to_set, dict) or not isinstance(to_multiply, dict) or not (to_set or to_multiply):
+            raise ValueError("'set' y 'multiply' deben ser objetos y al menos uno no vacío")
+
+        invalid = [f for f in to_set if f not in SETTABLE_FIELDS]
+        if invalid:
+            raise ValueError(f"Campos no actualizables: {', '.join(invalid)}")
+        if "name" in to_set and (not isinstance(to_set["name"], str) or len(to_set["name"]) > 100):
+            raise ValueError("Nombre debe ser string (max 100 caracteres)")
+        if "price" in to_set and (not isinstance(to_set["price"], (int, float)) or to_set["price"] <= 0):
+            raise ValueError("Precio debe ser número positivo")
+        if "description" in to_set and (not isinstance(to_set["description"], str) or len(to_set["description"]) > 500):
+            raise ValueError("Descripción debe ser string (max 500 caracteres)")
+        if "category_id" in to_set:
+            if not isinstance(to_set["category_id"], str):
+                raise ValueError("category_id debe ser un string")
+            category_doc = ProductService._get_db().collection("categories").document(to_set["category_id"]).get()
+            if not category_doc.exists:
+                raise ValueError(f"La categoría '{to_set['category_id']}' no existe")
+            to_set = dict(to_set, category=ProductService.category_snapshot(
+                category_doc.id, (category_doc.to_dict() or {}).get("name")
+            ))
+
+        for field, factor in to_multiply.items():
+            if field not in MULTIPLIABLE_FIELDS:
+                raise ValueError(f"Solo se puede multiplicar: {', '.join(MULTIPLIABLE_FIELDS)}")
+            if field in to_set:
+                raise ValueError(f"El campo '{field}' no puede estar en 'set' y 'multiply' a la vez")
+            if not isinstance(factor, (int, float)) or isinstance(factor, bool) or factor <= 0:
+                raise ValueError("El factor debe ser un número positivo")
+        return {"set": to_set, "multiply": to_multiply}
+
+    @classmethod
+    def _matches(cls, data: Dict, filters: Dict) -> bool:
+        price = data.get("price")
+        if "category_id" in filters and data.get("category_id") != filters["category_id"]:
+            return False
+        if "price_min" in filters and (price is None or price < filters["price_min"]):
+            return False
+        if "price_max" in filters and (price is None or price > filters["price_max"]):
+            return False
+        return True
+
+    @classmethod
+    def _iter_matches(cls, filters: Dict) -> Iterator[List]:
+        """Recorre por bloques los productos que cumplen el filtro"""
+        db = ProductService._get_db()
+        products_ref = db.collection("products")
+        chunk_size = Config.BULK_CHUNK_SIZE
+
+        if "ids" in filters:
+            ids = filters["ids"]
+            for start in range(0, len(ids), chunk_size):
+                refs = [products_ref.document(i) for i in ids[start:start + chunk_size]]
+                yield [doc for doc in db.get_all(refs) if doc.exists and cls._matches(doc.to_dict(), filters)]
+            return
+
+        query = products_ref
+        if "category_id" in filters:
+            query = query.where(filter=FieldFilter("category_id", "==", filters["category_id"]))
+        if "price_min" in filters:
+            query = query.where(filter=FieldFilter("price", ">=", filters["price_min"]))
+        if "price_max" in filters:
+            query = query.where(filter=FieldFilter("price", "<=", filters["price_max"]))
+
+        last = None
+        while True:
+            page = query.limit(chunk_size)
+            if last is not None:
+                page = page.start_after(last)
+            docs = list(page.stream())
+            if not docs:
+                return
+            yield docs
+            if len(docs) < chunk_size:
+                return
+            last = docs[-1]
+
+    @classmethod
+    def _collect_ids(cls, filters: Dict) -> List[str]:
+        """IDs que cumplen el filtro, leídos antes de modificar nada"""
+        ids = []
+        for docs in cls._iter_matches(filters):
+            ids.extend(doc.id for doc in docs)
+        return ids
+
+    @classmethod
+    def _compute_changes(cls, data: Dict, update: Dict) -> Dict:
+        changes = {k: v for k, v in update["set"].items() if data.get(k) != v}
+        for field, factor in update["multiply"].items():
+            current = data.get(field)
+            if isinstance(current, (int, float)):
+                new_value = round(current * factor, 2)
+                if new_value <= 0:
+                    raise ValueError(f"El resultado de '{field}' debe ser positivo")
+                if new_value != current:
+                    changes[field] = new_value
+        return changes
+
+    @classmethod
+    def start_update(cls, filters: Dict, update: Dict, dry_run: bool = False) -> Job:
+        return JobRegistry.submit("product_bulk_update", cls._run, filters, update, dry_run)
+
+    @classmethod
+    def start_delete(cls, filters: Dict, dry_run: bool = False) -> Job:
+        return JobRegistry.submit("product_bulk_delete", cls._run, filters, None, dry_run)
+
+    @classmethod
+    def _run(cls, job: Job, filters: Dict, update, dry_run: bool):
+        """
+        Aplica la operación bloque a bloque con un BulkWriter.
+        processed = documentos que cumplen el filtro, succeeded = modificados.
+        """
+        db = ProductService._get_db()
+        sample = []
+        would_modify = 0
+
+        # Si la actualización cambia un campo del filtro, la consulta paginada podría
+        # volver a encontrar documentos ya modificados: se fija primero el conjunto de IDs.
+        if update is not None and not dry_run and "ids" not in filters:
+            touched = set(update["set"]) | set(update["multiply"])
+            if touched & {"price", "category_id"}:
+                filters = dict(filters, ids=cls._collect_ids(filters))
+
+        for docs in cls._iter_matches(filters):
+            writer = None if dry_run else db.bulk_writer()
+            if writer is not None:
+                commits = CommitTimes()
+
+                def on_result(reference, result, bulk_writer):
+                    # Los borrados no traen update_time; sí las marcas que los acompañan
+                    commits.add("products", result.update_time)
+                    if reference.parent.id == "products":
+                        job.advance(succeeded=1)
+
+                def on_error(failure, bulk_writer):
+                    job.add_error(failure.operation.reference.id, failure.message)
+                    return False
+
+                writer.on_write_result(on_result)
+                writer.on_write_error(on_error)
+
+            for doc in docs:
+                job.advance(processed=1)
+                if update is None:
+                    changes = None
+                else:
+                    try:
+                        changes = cls._compute_changes(doc.to_dict(), update)
+                    except ValueError as e:
+                        job.add_error(doc.id, str(e))
+                        continue
+                    if not changes:
+                        continue
+
+                would_modify += 1
+                if dry_run:
+                    if len(sample) < DRY_RUN_SAMPLE_SIZE:
+                        sample.append({"id": doc.id, "changes": changes} if changes else {"id": doc.id})
+                elif changes is None:
+                    writer.delete(doc.reference)
+                    record_tombstone(writer, db, "products", doc.id)
+                else:
+                    changes["updated_at"] = SERVER_TIMESTAMP
+                    writer.update(doc.reference, changes)
+
+            if writer is not None:
+                writer.close()
+                if commits.times:
+                    read_flight.forget(commits.times)
+            JobRegistry.persist(job)
+
+        job.result = {
+            "dry_run": dry_run,
+            "matched": job.processed,
+            "modified": would_modify if dry_run else job.succeeded,
+        }
+        if dry_run:
+            job.result["sample"] = sample
@@ -0,0 +1,283 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..config import Config
+from .firestore_db import get_firestore_client
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("products", "categories")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """
+    Convierte un Last-Event-ID ('<read_time_us>-<colección>-<n>') en una tupla
+    comparable. La colección va en la clave porque los snapshots de products y
+    categories pueden compartir read_time; todos los workers generan los mismos IDs.
+    """
+    if not event_id:
+        return None
+    try:
+        micros, collection_index, ordinal = event_id.split("-")
+        return int(micros), int(collection_index), int(ordinal)
+    except ValueError:
+        return None
+
+
+def streaming_supported() -> bool:
+    """
+    True con workers gevent (o si SSE_ALLOW_SYNC_WORKERS): con workers sync
+    cada conexión SSE abierta bloquea el worker entero hasta el timeout.
+    """
+    if Config.SSE_ALLOW_SYNC_WORKERS:
+        return True
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("socket")
+
+
+class ChangeEvent:
+    """Un cambio (added / modified / removed) sobre un documento observado"""
+    __slots__ = ("id", "key", "collection", "type", "doc_id", "category_id", "payload")
+
+    def __init__(self, key: Tuple[int, int, int], collection: str, change_type: str, doc_id: str, data: Dict):
+        self.key = key
+        self.id = "-".join(str(part) for part in key)
+        self.collection = collection
+        self.type = change_type
+        self.doc_id = doc_id
+        self.category_id = data.get("category_id") if collection == "products" else doc_id
+        # Se serializa una sola vez y se comparte entre todos los clientes
+        self.payload = json.dumps({
+            "collection": collection,
+            "type": change_type,
+            "id": doc_id,
+            "data": None if change_type == "removed" else data,
+        }, default=_json_default)
+
+    def matches(self, collections: Iterable[str], category_id: Optional[str]) -> bool:
+        if self.collection not in collections:
+            return False
+        return category_id is None or self.category_id == category_id
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.payload}\n\n"
+
+
+class Subscription:
+    """Cola de eventos de un cliente conectado"""
+
+    def __init__(self, collections: List[str], category_id: Optional[str]):
+        self.collections = collections
+        self.category_id = category_id
+        self.queue = queue.Queue(maxsize=Config.SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def reset(self):
+        """Obliga al cliente a resincronizar (se despierta al generador con un None)"""
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def offer(self, event: ChangeEvent):
+        if self.overflowed or not event.matches(self.collections, self.category_id):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Cliente demasiado lento: se le pide que resincronice
+            self.overflowed = True
+
+
+class ChangeFeed:
+    """
+    Un único listener `on_snapshot` por colección y por worker, repartido
+    a todos los clientes conectados. Guarda un historial corto para reanudar
+    conexiones con Last-Event-ID.
+    """
+    _db = None
+    _lock = threading.Lock()
+    _watches = {}
+    _initialized = set()
+    _started_at: Dict[str, int] = {}
+    _subscribers = set()
+    _listeners = []
+    _restart_listeners = []
+    _tokens: Dict[str, object] = {}
+    _progress_at: Dict[str, float] = {}
+    _history = deque(maxlen=Config.CHANGE_FEED_HISTORY)
+
+    @classmethod
+    def _get_db(cls):
+        if cls._db is None:
+            cls._db = get_firestore_client()
+        return cls._db
+
+    @classmethod
+    def ensure_started(cls):
+        """Arranca los listeners que falten y sustituye los que hayan muerto"""
+        restarted = []
+        with cls._lock:
+            for collection in WATCHED_COLLECTIONS:
+                watch = cls._watches.get(collection)
+                if watch is not None and getattr(watch, "is_active", True):
+                    continue
+                if watch is not None:
+                    logger.warning(f"Listener de {collection} inactivo, se vuelve a crear")
+                    try:
+                        watch.unsubscribe()
+                    except Exception:
+                        pass
+                    # El primer snapshot del nuevo listener es otra carga completa
+                    cls._initialized.discard(collection)
+                    cls._started_at.pop(collection, None)
+                    restarted.append(collection)
+                callback = cls._make_callback(collection)
+                cls._watches[collection] = cls._get_db().collection(collection).on_snapshot(callback)
+            subscribers = list(cls._subscribers) if restarted else []
+            restart_listeners = list(cls._restart_listeners)
+
+        # Los cambios mientras el listener estuvo caído se han perdido
+        for subscription in subscribers:
+            if any(collection in subscription.collections for collection in restarted):
+                subscription.reset()
+        for collection in restarted:
+            for listener in restart_listeners:
+                try:
+                    listener(collection)
+                except Exception as e:
+                    logger.error(f"Error en consumidor de reinicio de {collection}: {str(e)}")
+
+    @classmethod
+    def add_restart_listener(cls, callback):
+        """`callback(collection)` se llama al sustituir un listener caído, antes de su nueva carga inicial"""
+        with cls._lock:
+            cls._restart_listeners.append(callback)
+
+    @classmethod
+    def add_listener(cls, callback):
+        """
+        Registra un consumidor interno `callback(collection, changes, read_time)`.
+        Recibe todos los cambios, incluida la carga inicial, por lo que debe
+        registrarse antes de que arranquen los listeners.
+        """
+        with cls._lock:
+            cls._listeners.append(callback)
+
+    @classmethod
+    def is_healthy(cls, collection: str) -> bool:
+        """True si el listener de `collection` sigue recibiendo cambios"""
+        watch = cls._watches.get(collection)
+        return watch is not None and getattr(watch, "is_active", True)
+
+    @classmethod
+    def silence(cls, collection: str) -> Optional[float]:
+        """
+        Segundos sin señales de vida del listener: ni snapshots ni un resume
+        token nuevo (Firestore lo renueva también sin cambios). None si no arrancó.
+        """
+        watch = cls._watches.get(collection)
+        if watch is None:
+            return None
+        now = time.monotonic()
+        token = getattr(watch, "resume_token", None)
+        if token != cls._tokens.get(collection):
+            cls._tokens[collection] = token
+            cls._progress_at[collection] = now
+        return now - cls._progress_at.setdefault(collection, now)
+
+    @classmethod
+    def _make_callback(cls, collection: str):
+        def on_snapshot(docs, changes, read_time):
+            cls._progress_at[collection] = time.monotonic()
+            for listener in cls._listeners:
+                try:
+                    listener(collection, changes, read_time)
+                except Exception as e:
+                    logger.error(f"Error en consumidor de cambios de {collection}: {str(e)}")
+            try:
+                cls._handle_snapshot(collection, changes, read_time)
+            except Exception as e:
+                logger.error(f"Error procesando cambios de {collection}: {str(e)}")
+        return on_snapshot
+
+    @classmethod
+    def _handle_snapshot(cls, collection: str, changes, read_time):
+        micros = int(read_time.timestamp() * 1_000_000)
+
+        # El primer snapshot es la carga inicial completa, no son cambios.
+        # Los cambios anteriores a su read_time no están en este historial.
+        if collection not in cls._initialized:
+            cls._initialized.add(collection)
+            cls._started_at[collection] = micros
+            return
+
+        events = []
+        collection_index = WATCHED_COLLECTIONS.index(collection)
+        for ordinal, change in enumerate(changes):
+            doc = change.document
+            events.append(ChangeEvent(
+                (micros, collection_index, ordinal), collection, change.type.name.lower(), doc.id, doc.to_dict() or {}
+            ))
+
+        with cls._lock:
+            cls._history.extend(events)
+            subscribers = list(cls._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                subscription.offer(event)
+
+    @classmethod
+    def subscribe(cls, collections: List[str], category_id: Optional[str] = None,
+                  last_event_id: Optional[str] = None) -> Tuple[Subscription, Optional[List[ChangeEvent]]]:
+        """
+        Registra un cliente. Devuelve la suscripción y los eventos a repetir
+        desde Last-Event-ID, o None si ese punto ya no está en el historial.
+        """
+        cls.ensure_started()
+        subscription = Subscription(collections, category_id)
+        last_key = parse_event_id(last_event_id)
+        with cls._lock:
+            cls._subscribers.add(subscription)
+            if last_event_id and last_key is None:
+                # ID ilegible (p. ej. de una versión anterior): no se sabe qué falta
+                return subscription, None
+            if last_key is None:
+                return subscription, []
+            # Reanudación anterior al arranque de este listener (reinicio o
+            # reconexión a otro worker): los cambios intermedios se desconocen
+            for collection in collections:
+                started_at = cls._started_at.get(collection)
+                if started_at is None or last_key[0] < started_at:
+                    return subscription, None
+            if cls._history and cls._history[0].key > last_key:
+                return subscription, None
+            replay = [event for event in cls._history
+                      if event.key > last_key and event.matches(collections, category_id)]
+        return subscription, replay
+
+    @classmethod
+    def unsubscribe(cls, subscription: Subscription):
+        with cls._lock:
+            cls._subscribers.discard(subscription)
+
+    @classmethod
+    def subscriber_count(cls) -> int:
+        return len(cls._subscribers)
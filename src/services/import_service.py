@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Iterator, List, Tuple
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+from ..config import Config
+from .jobs import Job, JobRegistry
+from .product_service import ProductService
+from .singleflight import CommitTimes, read_flight
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+IMPORT_FIELDS = ("name", "price", "category_id", "description")
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class ImportService:
+    """Importación masiva de productos desde archivos CSV o NDJSON"""
+
+    @classmethod
+    def spool_upload(cls, stream, max_bytes: int = None) -> str:
+        """
+        Copia el cuerpo de la petición a un archivo temporal por bloques.
+        Devuelve la ruta del archivo; la memoria usada no depende del tamaño del archivo.
+        """
+        max_bytes = max_bytes or Config.IMPORT_MAX_BYTES
+        fd, path = tempfile.mkstemp(prefix="import-", suffix=".upload")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    block = stream.read(_COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > max_bytes:
+                        raise ValueError(f"El archivo supera el máximo de {max_bytes} bytes")
+                    tmp.write(block)
+        except Exception:
+            os.unlink(path)
+            raise
+        if written == 0:
+            os.unlink(path)
+            raise ValueError("El archivo está vacío")
+        return path
+
+    @classmethod
+    def start(cls, path: str, fmt: str) -> Job:
+        """Lanza la importación del archivo en segundo plano"""
+        if fmt not in SUPPORTED_FORMATS:
+            os.unlink(path)
+            raise ValueError(f"Formato no soportado: {fmt}. Use uno de: {', '.join(SUPPORTED_FORMATS)}")
+        return JobRegistry.submit("product_import", cls._run, path, fmt)
+
+    @classmethod
+    def _run(cls, job: Job, path: str, fmt: str):
+        try:
+            with open(path, "rb") as raw:
+                text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+                chunk = []
+                for row_number, row in cls._iter_rows(text, fmt, job):
+                    chunk.append((row_number, row))
+                    if len(chunk) >= Config.IMPORT_CHUNK_SIZE:
+                        cls._import_chunk(job, chunk)
+                        chunk = []
+                if chunk:
+                    cls._import_chunk(job, chunk)
+        finally:
+            os.unlink(path)
+
+    @classmethod
+    def _iter_rows(cls, text, fmt: str, job: Job) -> Iterator[Tuple[int, Dict]]:
+        """Lee el archivo fila a fila; las filas ilegibles se reportan y se omiten"""
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                # La fila 1 es la cabecera
+                yield reader.line_num, row
+            return
+
+        for row_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                job.advance(processed=1)
+                job.add_error(row_number, f"JSON inválido: {str(e)}")
+                continue
+            if not isinstance(row, dict):
+                job.advance(processed=1)
+                job.add_error(row_number, "Cada línea debe ser un objeto JSON")
+                continue
+            yield row_number, row
+
+    @classmethod
+    def _coerce_row(cls, row: Dict) -> Dict:
+        """Normaliza una fila: solo campos conocidos y precio numérico (CSV trae strings)"""
+        data = {k: row[k] for k in IMPORT_FIELDS if k in row and row[k] not in (None, "")}
+        if isinstance(data.get("price"), str):
+            try:
+                data["price"] = float(data["price"])
+            except ValueError:
+                raise ValueError("Precio debe ser número positivo")
+        if "category_id" in data:
+            if not isinstance(data["category_id"], str) or not data["category_id"].strip():
+                raise ValueError("category_id debe ser un string no vacío")
+            data["category_id"] = data["category_id"].strip()
+            # Un '/' rompería la lectura por lotes de categorías de todo el bloque
+            if "/" in data["category_id"]:
+                raise ValueError(f"category_id inválido: {data['category_id']!r}")
+        return data
+
+    @classmethod
+    def _import_chunk(cls, job: Job, chunk: List[Tuple[int, Dict]]):
+        db = ProductService._get_db()
+
+        valid = []
+        for row_number, row in chunk:
+            try:
+                data = cls._coerce_row(row)
+                ProductService.check_product_fields(data)
+                valid.append((row_number, data))
+            except ValueError as e:
+                job.advance(processed=1)
+                job.add_error(row_number, str(e))
+
+        if valid:
+            # Resolver todas las categorías del bloque con una sola lectura
+            category_ids = {data["category_id"] for _, data in valid}
+            refs = [db.collection("categories").document(cid) for cid in category_ids]
+            existing = {doc.id: doc.get("name") for doc in db.get_all(refs, field_paths=["name"]) if doc.exists}
+            if category_ids - set(existing):
+                existing.setdefault(ProductService.ensure_uncategorized(), "Uncategorized")
+
+            pending = {}
+            commits = CommitTimes()
+            writer = db.bulk_writer()
+
+            def on_result(reference, result, bulk_writer):
+                pending.pop(reference.path, None)
+                commits.add("products", result.update_time)
+                job.advance(processed=1, succeeded=1)
+
+            def on_error(failure, bulk_writer):
+                row_number = pending.pop(failure.operation.reference.path, None)
+                job.advance(processed=1)
+                job.add_error(row_number, failure.message)
+                return False
+
+            writer.on_write_result(on_result)
+            writer.on_write_error(on_error)
+            for row_number, data in valid:
+                if data["category_id"] not in existing:
+                    data["category_id"] = "uncategorized"
+                data["category"] = ProductService.category_snapshot(data["category_id"], existing[data["category_id"]])
+                data["created_at"] = SERVER_TIMESTAMP
+                data["updated_at"] = SERVER_TIMESTAMP
+                doc_ref = db.collection("products").document()
+                pending[doc_ref.path] = row_number
+                writer.create(doc_ref, data)
+            writer.close()
+            if commits.times:
+                read_flight.forget(commits.times)
+
+        JobRegistry.persist(job)
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from ..config import Config
+from .firestore_db import get_firestore_client
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Estado y progreso de un trabajo en segundo plano"""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "pending"  # pending | running | completed | failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+        self.result = {}
+        self.error = None
+        self._lock = threading.Lock()
+
+    def advance(self, processed: int = 0, succeeded: int = 0, failed: int = 0):
+        with self._lock:
+            self.processed += processed
+            self.succeeded += succeeded
+            self.failed += failed
+
+    def add_error(self, row, message: str):
+        """Registra el error de una fila concreta (acotado para no crecer sin límite)"""
+        with self._lock:
+            self.failed += 1
+            if len(self.errors) < Config.IMPORT_MAX_ROW_ERRORS:
+                self.errors.append({"row": row, "error": message})
+            else:
+                self.errors_truncated = True
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "processed": self.processed,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+                "errors": list(self.errors),
+                "errors_truncated": self.errors_truncated,
+                "result": dict(self.result),
+                "error": self.error,
+            }
+
+
+class JobRegistry:
+    """
+    Registro de trabajos del worker actual.
+    El estado también se persiste en `_jobs` para que cualquier worker pueda consultarlo.
+    """
+    MAX_JOBS = 100
+    _jobs: "OrderedDict[str, Job]" = OrderedDict()
+    _lock = threading.Lock()
+    _db = None
+
+    @classmethod
+    def _get_db(cls):
+        if cls._db is None:
+            cls._db = get_firestore_client()
+        return cls._db
+
+    @classmethod
+    def submit(cls, kind: str, target: Callable, *args) -> Job:
+        """Lanza `target(job, *args)` en un hilo y devuelve el trabajo creado"""
+        job = Job(kind)
+        with cls._lock:
+            cls._jobs[job.id] = job
+            while len(cls._jobs) > cls.MAX_JOBS:
+                cls._jobs.popitem(last=False)
+        cls.persist(job)
+        thread = threading.Thread(target=cls._run, args=(job, target, args), name=f"job-{job.id}", daemon=True)
+        thread.start()
+        return job
+
+    @classmethod
+    def _run(cls, job: Job, target: Callable, args):
+        job.status = "running"
+        job.started_at = time.time()
+        cls.persist(job)
+        try:
+            target(job, *args)
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"Fallo en trabajo {job.kind} {job.id}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            cls.persist(job)
+
+    @classmethod
+    def persist(cls, job: Job):
+        try:
+            cls._get_db().collection("_jobs").document(job.id).set(job.to_dict())
+        except Exception as e:
+            logger.warning(f"No se pudo persistir el trabajo {job.id}: {str(e)}")
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[Dict]:
+        job = cls._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        doc = cls._get_db().collection("_jobs").document(job_id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
@@ -42,6 +42,11 @@ def _get_migrations():
             "version": "1.2-create-users-collection",
             "description": "Crea la colección de usuarios y un usuario admin de ejemplo",
             "up": _create_users_collection
+        },
+        {
+            "version": "1.3-embed-category-snapshot",
+            "description": "Embebe una copia de la categoría (id, name) en cada producto",
+            "up": _embed_category_snapshot
         }
     ]
 
@@ -101,4 +106,20 @@ def _create_users_collection(db):
             "created_at": datetime.now().isoformat(),
             "role": "admin"
         }
-        users_ref.document().set(admin_data)
\ No newline at end of file
+        users_ref.document().set(admin_data)
+
+def _embed_category_snapshot(db):
+    """Migración que agrega a cada producto la copia {id, name} de su categoría"""
+    categories = {doc.id: (doc.to_dict() or {}).get("name") for doc in db.collection("categories").stream()}
+    writer = db.bulk_writer()
+
+    for product in db.collection("products").select(["category_id", "category"]).stream():
+        data = product.to_dict() or {}
+        category_id = data.get("category_id")
+        if not category_id:
+            continue
+        snapshot = {"id": category_id, "name": categories.get(category_id)}
+        if data.get("category") != snapshot:
+            writer.update(product.reference, {"category": snapshot, "updated_at": firestore.SERVER_TIMESTAMP})
+
+    writer.close()
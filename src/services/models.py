@@ -0,0 +1,143 @@
+import json
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from werkzeug.http import http_date
+
+
+def _default(value):
+    # Mismo formato que usa jsonify para las fechas
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Objeto de tipo {type(value).__name__} no serializable a JSON")
+
+
+# Misma configuración que el proveedor JSON por defecto de Flask (claves ordenadas, compacto)
+_encode = json.JSONEncoder(ensure_ascii=True, separators=(",", ":"), sort_keys=True, default=_default).encode
+_KEY_PREFIXES: Dict[str, str] = {}
+
+
+def _key(name: str) -> str:
+    prefix = _KEY_PREFIXES.get(name)
+    if prefix is None:
+        prefix = _KEY_PREFIXES[name] = _encode(name) + ":"
+    return prefix
+
+
+class _Model:
+    """
+    Base de los modelos compactos: un slot por campo conocido (FIELDS es el
+    mapeo compartido clave de Firestore -> atributo) y `extra` solo para
+    campos no previstos. Se serializan a JSON sin pasar por un dict.
+    """
+    __slots__ = ("id", "update_time", "extra")
+    FIELDS: tuple = ()
+
+    def __init__(self, doc_id: str, data: Dict, update_time=None):
+        self.id = doc_id
+        self.update_time = update_time
+        extra = None
+        for key, value in data.items():
+            if key in self._FIELD_SET:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        for field in self.FIELDS:
+            if field not in data:
+                setattr(self, field, _MISSING)
+        self.extra = extra
+
+    @classmethod
+    def from_snapshot(cls, doc):
+        return cls(doc.id, doc.to_dict() or {}, doc.update_time)
+
+    def get(self, field: str, default=None):
+        value = getattr(self, field, _MISSING)
+        if value is _MISSING:
+            return self.extra.get(field, default) if self.extra else default
+        return value
+
+    def _items(self, skip=()) -> List:
+        items = [("id", self.id)]
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING and field not in skip:
+                items.append((field, value))
+        if self.extra:
+            items.extend((k, v) for k, v in self.extra.items() if k not in skip)
+        return items
+
+    def to_dict(self, skip=()) -> Dict:
+        return dict(self._items(skip))
+
+    def _json(self, items) -> str:
+        items.sort(key=lambda item: item[0])
+        return "{" + ",".join(_key(k) + _encode(v) for k, v in items) + "}"
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+
+_MISSING = _Missing()
+
+
+class Product(_Model):
+    __slots__ = ("name", "price", "category_id", "description", "category", "created_at", "updated_at")
+    FIELDS = __slots__
+    _FIELD_SET = frozenset(FIELDS)
+
+    def to_dict(self, include_category: bool = True) -> Dict:
+        return super().to_dict(() if include_category else ("category",))
+
+    def to_json(self, include_category: bool = True, fallback_category: Optional[Dict] = None) -> str:
+        items = self._items(() if include_category else ("category",))
+        if include_category and self.category is _MISSING and fallback_category is not None:
+            items.append(("category", fallback_category))
+        return self._json(items)
+
+
+class Category(_Model):
+    __slots__ = ("name", "description", "created_at", "updated_at", "products")
+    FIELDS = ("name", "description", "created_at", "updated_at")
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, doc_id: str, data: Dict, update_time=None):
+        super().__init__(doc_id, data, update_time)
+        self.products = None
+
+    def to_dict(self) -> Dict:
+        category_data = super().to_dict()
+        if self.products is not None:
+            category_data["products"] = [p.to_dict(include_category=False) for p in self.products]
+            category_data["products_count"] = len(self.products)
+        return category_data
+
+    def to_json(self, products: Optional[List[Product]] = None) -> str:
+        """`products` sustituye a self.products sin modificar el modelo (modelos compartidos)"""
+        if products is None:
+            products = self.products
+        items = self._items()
+        if products is None:
+            return self._json(items)
+        # Los productos se insertan ya serializados en su posición alfabética
+        items.append(("products", None))
+        items.append(("products_count", len(products)))
+        items.sort(key=lambda item: item[0])
+        parts = []
+        for key, value in items:
+            if key == "products":
+                parts.append(_key(key) + dumps_list(products, include_category=False))
+            else:
+                parts.append(_key(key) + _encode(value))
+        return "{" + ",".join(parts) + "}"
+
+
+def dumps_list(models: Iterable[_Model], **kwargs) -> str:
+    """Serializa una lista de modelos directamente a texto JSON"""
+    return "[" + ",".join(model.to_json(**kwargs) for model in models) + "]"
@@ -1,9 +1,15 @@
+import math
 from firebase_admin import firestore
 from .firestore_db import get_firestore_client
 from typing import List, Dict, Optional
 from datetime import datetime
 import json
 from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from .sync import SyncService, record_tombstone
+from .singleflight import read_flight
+from .jobs import Job, JobRegistry
+from .models import Category, Product
+from ..config import Config
 
 class ProductService:
     _db = None
@@ -28,31 +34,54 @@ class ProductService:
         return serialized
 
     @classmethod
-    def validate_product_data(cls, data: Dict) -> Dict:
+    def check_product_fields(cls, data: Dict, partial: bool = False) -> None:
+        """Valida campos y tipos sin tocar Firestore (partial: solo los presentes)"""
         required_fields = ["name", "price", "category_id"]
         for field in required_fields:
-            if field not in data:
+            if field not in data and not partial:
                 raise ValueError(f"Campo requerido faltante: {field}")
-        if not isinstance(data["name"], str) or len(data["name"]) > 100:
+        if "name" in data and (not isinstance(data["name"], str) or len(data["name"]) > 100):
             raise ValueError("Nombre debe ser string (max 100 caracteres)")
-        if not isinstance(data["price"], (int, float)) or data["price"] <= 0:
+        # NaN e infinito pasarían la comparación con 0 (float("nan"), "1e400", NaN en NDJSON)
+        if "price" in data and (not isinstance(data["price"], (int, float)) or not math.isfinite(data["price"])
+                                or data["price"] <= 0):
             raise ValueError("Precio debe ser número positivo")
-        category_ref = cls._get_db().collection("categories").document(data["category_id"])
-        category_doc = category_ref.get()
-        if not category_doc.exists:
-            uncategorized_ref = cls._get_db().collection("categories").document("uncategorized")
-            uncategorized_doc = uncategorized_ref.get()
-            if not uncategorized_doc.exists:
-                uncategorized_ref.set({
-                    "name": "Uncategorized",
-                    "description": "Productos sin categoría asignada",
-                    "created_at": SERVER_TIMESTAMP,
-                    "updated_at": SERVER_TIMESTAMP
-                })
-            data["category_id"] = "uncategorized"
+        if "category_id" in data and (not isinstance(data["category_id"], str) or not data["category_id"]):
+            raise ValueError("category_id debe ser un string")
         if "description" in data and (not isinstance(data["description"], str) or len(data["description"]) > 500):
             raise ValueError("Descripción debe ser string (max 500 caracteres)")
+
+    @classmethod
+    def ensure_uncategorized(cls) -> str:
+        """Crea la categoría 'uncategorized' si no existe y devuelve su ID"""
+        uncategorized_ref = cls._get_db().collection("categories").document("uncategorized")
+        uncategorized_doc = uncategorized_ref.get()
+        if not uncategorized_doc.exists:
+            uncategorized_ref.set({
+                "name": "Uncategorized",
+                "description": "Productos sin categoría asignada",
+                "created_at": SERVER_TIMESTAMP,
+                "updated_at": SERVER_TIMESTAMP
+            })
+        return "uncategorized"
+
+    @staticmethod
+    def category_snapshot(category_id: str, name: Optional[str]) -> Dict:
+        """Copia mínima de la categoría que se guarda dentro de cada producto"""
+        return {"id": category_id, "name": name}
+
+    @classmethod
+    def validate_product_data(cls, data: Dict) -> Dict:
+        cls.check_product_fields(data)
+        category_ref = cls._get_db().collection("categories").document(data["category_id"])
+        category_doc = category_ref.get()
+        if category_doc.exists:
+            category_name = (category_doc.to_dict() or {}).get("name")
+        else:
+            data["category_id"] = cls.ensure_uncategorized()
+            category_name = "Uncategorized"
         validated_data = data.copy()
+        validated_data["category"] = cls.category_snapshot(data["category_id"], category_name)
         validated_data["created_at"] = SERVER_TIMESTAMP
         validated_data["updated_at"] = SERVER_TIMESTAMP
         return validated_data
@@ -61,12 +90,9 @@ class ProductService:
     def create(cls, data: Dict) -> Dict:
         validated_data = cls.validate_product_data(data)
         doc_ref = cls._get_db().collection("products").document()
-        doc_ref.set(validated_data)
-        product_data = {"id": doc_ref.id, **cls._serialize_firestore_data(validated_data)}
-        category = cls._get_db().collection("categories").document(validated_data["category_id"]).get()
-        if category.exists:
-            product_data["category"] = {"id": category.id, **cls._serialize_firestore_data(category.to_dict())}
-        return product_data
+        result = doc_ref.set(validated_data)
+        read_flight.forget({"products": result.update_time})
+        return {"id": doc_ref.id, **cls._serialize_firestore_data(validated_data)}
 
     @classmethod
     def update(cls, product_id: str, data: Dict) -> Dict:
@@ -76,22 +102,22 @@ class ProductService:
             raise ValueError("Producto no encontrado")
         validated_data = cls.validate_product_data(data)
         validated_data["updated_at"] = SERVER_TIMESTAMP
-        doc_ref.update(validated_data)
+        result = doc_ref.update(validated_data)
+        read_flight.forget({"products": result.update_time})
         updated_doc = doc_ref.get()
-        product_data = {"id": updated_doc.id, **updated_doc.to_dict()}
-        category = cls._get_db().collection("categories").document(validated_data["category_id"]).get()
-        if category.exists:
-            product_data["category"] = {"id": category.id, **category.to_dict()}
-        return product_data
+        return {"id": updated_doc.id, **updated_doc.to_dict()}
 
     @classmethod
     def get_by_category(cls, category_id: str) -> List[Dict]:
         category_doc = cls._get_db().collection("categories").document(category_id).get()
         if not category_doc.exists:
             raise ValueError("Categoría no encontrada")
-        products_ref = cls._get_db().collection("products")
-        query = products_ref.where("category_id", "==", category_id)
-        return [{"id": doc.id, **doc.to_dict()} for doc in query.stream()]
+        return [product.to_dict(include_category=False) for product in cls._query_by_category(category_id)]
+
+    @classmethod
+    def _query_by_category(cls, category_id: str) -> List[Product]:
+        query = cls._get_db().collection("products").where("category_id", "==", category_id)
+        return [Product.from_snapshot(doc) for doc in query.stream()]
 
     @classmethod
     def delete(cls, product_id: str) -> bool:
@@ -103,7 +129,12 @@ class ProductService:
         if not doc.exists:
             raise ValueError("Producto no encontrado")
         
-        doc_ref.delete()
+        # El borrado deja una marca para la sincronización incremental
+        batch = cls._get_db().batch()
+        batch.delete(doc_ref)
+        record_tombstone(batch, cls._get_db(), "products", product_id)
+        batch.commit()
+        read_flight.forget({"products": batch.commit_time})
         return True
 
     @classmethod
@@ -127,6 +158,8 @@ class ProductService:
             created_products.append({"id": doc_ref.id, **validated_data})
         
         batch.commit()
+        if created_products:
+            read_flight.forget({"products": batch.commit_time})
         return created_products
 
     @classmethod
@@ -154,30 +187,132 @@ class ProductService:
         ]
 
     @classmethod
-    def get_all(cls, include_category: bool = False) -> List[Dict]:
-        products_ref = cls._get_db().collection("products")
+    def get_all(cls, include_category: bool = False, category_id: Optional[str] = None,
+                sort: Optional[str] = None) -> List[Product]:
+        """
+        Listado de productos como modelos compactos (serializar con models.dumps_list).
+        Lecturas concurrentes idénticas comparten una sola consulta.
+        """
+        return read_flight.do(
+            ("products:list", include_category, category_id, sort),
+            lambda: cls._load_all(include_category, category_id, sort)
+        )
+
+    @classmethod
+    def _load_all(cls, include_category: bool, category_id: Optional[str] = None,
+                  sort: Optional[str] = None) -> List[Product]:
+        query = cls._get_db().collection("products")
+        if category_id is not None:
+            query = query.where("category_id", "==", category_id)
+        if sort == "price":
+            query = query.order_by("price")
         products = []
-        for doc in products_ref.stream():
-            product_data = {"id": doc.id, **doc.to_dict()}
-            if include_category:
-                category = cls._get_db().collection("categories").document(product_data.get("category_id")).get()
-                if category.exists:
-                    product_data["category"] = {"id": category.id, **category.to_dict()}
-            products.append(product_data)
+        legacy_categories = {}
+        for doc in query.stream():
+            products.append(cls._with_category(Product.from_snapshot(doc), include_category, legacy_categories))
         return products
 
+    @classmethod
+    def _with_category(cls, product: Product, include_category: bool, legacy_categories: Dict = None) -> Product:
+        """
+        Usa la copia de la categoría embebida en el producto. Solo los productos
+        anteriores a la migración 1.3 necesitan leer la categoría (una vez por ID).
+        """
+        category_id = product.get("category_id")
+        if include_category and product.get("category") is None and category_id:
+            if legacy_categories is None:
+                legacy_categories = {}
+            if category_id not in legacy_categories:
+                category = cls._get_db().collection("categories").document(category_id).get()
+                legacy_categories[category_id] = (
+                    cls.category_snapshot(category.id, (category.to_dict() or {}).get("name")) if category.exists else None
+                )
+            if legacy_categories[category_id] is not None:
+                product.category = legacy_categories[category_id]
+        return product
+
     @classmethod
     def get_by_id(cls, product_id: str, include_category: bool = False) -> Optional[Dict]:
-        doc_ref = cls._get_db().collection("products").document(product_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        doc = cls.get_snapshot(product_id)
+        if doc is None:
             return None
-        product_data = {"id": doc.id, **doc.to_dict()}
+        return cls.from_snapshot(doc, include_category)
+
+    @classmethod
+    def parse_ids(cls, product_ids) -> List[str]:
+        """Valida la lista de IDs de una lectura múltiple"""
+        if not isinstance(product_ids, list) or not product_ids:
+            raise ValueError("Se esperaba una lista no vacía de IDs de producto")
+        if len(product_ids) > Config.MULTI_GET_MAX_IDS:
+            raise ValueError(f"Se admiten como máximo {Config.MULTI_GET_MAX_IDS} IDs por petición")
+        for product_id in product_ids:
+            if not isinstance(product_id, str) or not product_id or "/" in product_id:
+                raise ValueError(f"ID de producto inválido: {product_id!r}")
+        return product_ids
+
+    @classmethod
+    def get_many(cls, product_ids: List[str], include_category: bool = False) -> List[Dict]:
+        """
+        Varios productos con una sola llamada a `get_all`, en el orden pedido.
+        Los IDs inexistentes se devuelven como {"id": ..., "missing": True}.
+        """
+        db = cls._get_db()
+        products_ref = db.collection("products")
+        unique_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        for doc in db.get_all([products_ref.document(product_id) for product_id in unique_ids]):
+            if doc.exists:
+                found[doc.id] = Product.from_snapshot(doc)
+
+        # Productos anteriores a la migración 1.3: sus categorías en otra única lectura
+        legacy_categories = {}
         if include_category:
-            category = cls._get_db().collection("categories").document(product_data.get("category_id")).get()
-            if category.exists:
-                product_data["category"] = {"id": category.id, **category.to_dict()}
-        return product_data
+            category_ids = {
+                product.get("category_id") for product in found.values()
+                if product.get("category") is None and product.get("category_id")
+            }
+            if category_ids:
+                refs = [db.collection("categories").document(category_id) for category_id in category_ids]
+                legacy_categories = dict.fromkeys(category_ids)
+                for category in db.get_all(refs, field_paths=["name"]):
+                    if category.exists:
+                        legacy_categories[category.id] = cls.category_snapshot(category.id, category.get("name"))
+
+        products = []
+        for product_id in product_ids:
+            product = found.get(product_id)
+            if product is None:
+                products.append({"id": product_id, "missing": True})
+            else:
+                products.append(cls._with_category(product, include_category, legacy_categories).to_dict(include_category))
+        return products
+
+    @classmethod
+    def get_snapshot(cls, product_id: str):
+        """Snapshot del producto (incluye `update_time`) o None si no existe"""
+        def load():
+            doc = cls._get_db().collection("products").document(product_id).get()
+            return doc if doc.exists else None
+        return read_flight.do(("products:doc", product_id), load)
+
+    @classmethod
+    def from_snapshot(cls, doc, include_category: bool = False) -> Dict:
+        return cls._with_category(Product.from_snapshot(doc), include_category).to_dict(include_category)
+
+    @classmethod
+    def collection_version(cls, include_category: bool = False):
+        """
+        (etag, last_modified) del listado de productos. Con include_category
+        incluye también la versión de categorías: un renombrado invalida la
+        caché en el acto, sin esperar a que termine la propagación a los productos.
+        """
+        version, last_modified = SyncService.collection_version("products")
+        if include_category:
+            category_version, category_modified = SyncService.collection_version("categories")
+            version = f"{version}:{category_version}"
+            if category_modified and (last_modified is None or category_modified > last_modified):
+                last_modified = category_modified
+        return version, last_modified
 
 
 class CategoryService:
@@ -208,41 +343,66 @@ class CategoryService:
     def create(cls, data: Dict) -> Dict:
         validated_data = cls.validate_category_data(data)
         doc_ref = cls._get_db().collection("categories").document()
-        doc_ref.set(validated_data)
+        result = doc_ref.set(validated_data)
+        read_flight.forget({"categories": result.update_time})
         doc = doc_ref.get()
         return {"id": doc.id, **doc.to_dict()}
 
     @classmethod
-    def get_all(cls, include_products: bool = False) -> List[Dict]:
+    def get_all(cls, include_products: bool = False) -> List[Category]:
         """
-        Obtener todas las categorías
+        Obtener todas las categorías como modelos compactos (serializar con models.dumps_list)
         Args:
             include_products: Si True, incluye lista de productos en cada categoría
         """
+        return read_flight.do(("categories:list", include_products), lambda: cls._load_all(include_products))
+
+    @classmethod
+    def _load_all(cls, include_products: bool) -> List[Category]:
         categories_ref = cls._get_db().collection("categories")
         categories = []
         
         for doc in categories_ref.stream():
-            category_data = {"id": doc.id, **doc.to_dict()}
+            category = Category.from_snapshot(doc)
             
             if include_products:
-                products = ProductService.get_by_category(doc.id)
-                category_data["products"] = products
-                category_data["products_count"] = len(products)
+                category.products = ProductService._query_by_category(doc.id)
             
-            categories.append(category_data)
+            categories.append(category)
         
         return categories
 
+    @classmethod
+    def collection_version(cls, include_products: bool = False):
+        """(etag, last_modified) del listado de categorías"""
+        version, last_modified = SyncService.collection_version("categories")
+        if include_products:
+            products_version, products_modified = SyncService.collection_version("products")
+            version = f"{version}:{products_version}"
+            if products_modified and (last_modified is None or products_modified > last_modified):
+                last_modified = products_modified
+        return version, last_modified
+
+    @classmethod
+    def get_snapshot(cls, category_id: str):
+        """Snapshot de la categoría (incluye `update_time`) o None si no existe"""
+        def load():
+            doc = cls._get_db().collection("categories").document(category_id).get()
+            return doc if doc.exists else None
+        return read_flight.do(("categories:doc", category_id), load)
+
     @classmethod
     def get_by_id(cls, category_id: str, include_products: bool = False) -> Optional[Dict]:
         """Obtener una categoría por ID con opción de incluir productos"""
-        doc_ref = cls._get_db().collection("categories").document(category_id)
-        doc = doc_ref.get()
+        doc = cls.get_snapshot(category_id)
         
-        if not doc.exists:
+        if doc is None:
             return None
             
+        return cls.from_snapshot(doc, include_products)
+
+    @classmethod
+    def from_snapshot(cls, doc, include_products: bool = False) -> Dict:
         category_data = {"id": doc.id, **doc.to_dict()}
         
         if include_products:
@@ -260,9 +420,59 @@ class CategoryService:
             raise ValueError("Categoría no encontrada")
         validated_data = cls.validate_category_data(data)
         validated_data["updated_at"] = SERVER_TIMESTAMP
-        doc_ref.update(validated_data)
+        result = doc_ref.update(validated_data)
+        read_flight.forget({"categories": result.update_time})
+        if (doc.to_dict() or {}).get("name") != validated_data["name"]:
+            # Propagar el nuevo nombre a la copia embebida en los productos
+            JobRegistry.submit("category_snapshot_fanout", cls._fan_out_snapshot, category_id, validated_data["name"])
         return {"id": doc_ref.id, **doc_ref.get().to_dict()}
 
+    @classmethod
+    def _fan_out_snapshot(cls, job: Job, category_id: str, name: str):
+        """
+        Actualiza por bloques la categoría embebida en los productos de `category_id`.
+        Cada bloque se escribe en una transacción que relee la categoría: si se
+        renombró otra vez, este trabajo se detiene (ya hay otro con el nombre nuevo)
+        y un bloque en vuelo nunca puede dejar el nombre antiguo tras el nuevo.
+        """
+        db = cls._get_db()
+        category_ref = db.collection("categories").document(category_id)
+        # Una transacción admite como máximo 500 escrituras
+        chunk_size = min(Config.BULK_CHUNK_SIZE, 500)
+        query = db.collection("products").where("category_id", "==", category_id).limit(chunk_size)
+        snapshot = ProductService.category_snapshot(category_id, name)
+
+        @firestore.transactional
+        def write_chunk(transaction, refs) -> Optional[int]:
+            category = category_ref.get(transaction=transaction)
+            if not category.exists or category.get("name") != name:
+                return None
+            updated = 0
+            for doc in transaction.get_all(refs):
+                if doc.exists and (doc.to_dict() or {}).get("category") != snapshot:
+                    transaction.update(doc.reference, {"category": snapshot, "updated_at": SERVER_TIMESTAMP})
+                    updated += 1
+            return updated
+
+        last = None
+        while True:
+            page = query.start_after(last) if last is not None else query
+            docs = list(page.select(["category_id"]).stream())
+            if not docs:
+                break
+            transaction = db.transaction()
+            updated = write_chunk(transaction, [doc.reference for doc in docs])
+            if updated is None:
+                job.add_error(category_id, "La categoría cambió de nombre de nuevo; la propagación sigue en otro trabajo")
+                break
+            job.advance(processed=len(docs), succeeded=updated)
+            if updated:
+                read_flight.forget({"products": transaction.commit_time})
+            JobRegistry.persist(job)
+            if len(docs) < chunk_size:
+                break
+            last = docs[-1]
+
     @classmethod
     def delete(cls, category_id: str) -> Dict:
         """
@@ -294,10 +504,19 @@ class CategoryService:
         products_reassigned = 0
         batch = cls._get_db().batch()
         for doc in products:
-            batch.update(doc.reference, {"category_id": "uncategorized"})
+            batch.update(doc.reference, {
+                "category_id": "uncategorized",
+                "category": ProductService.category_snapshot("uncategorized", "Uncategorized"),
+                "updated_at": SERVER_TIMESTAMP
+            })
             products_reassigned += 1
         batch.delete(category_ref)
+        record_tombstone(batch, cls._get_db(), "categories", category_id)
         batch.commit()
+        commit_times = {"categories": batch.commit_time}
+        if products_reassigned:
+            commit_times["products"] = batch.commit_time
+        read_flight.forget(commit_times)
         
         return {
             "message": f"Categoría eliminada y {products_reassigned} productos reasignados",
@@ -0,0 +1,282 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ..config import Config
+from .change_feed import ChangeFeed
+from .models import Category, Product
+from .singleflight import read_flight
+from .sync import SyncService
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogReplica:
+    """
+    Réplica en memoria de `products` y `categories` por worker.
+    Se carga y se mantiene al día con los listeners de ChangeFeed y sirve las
+    lecturas desde índices locales (por id, por category_id y por precio).
+    Las escrituras siguen yendo a Firestore. Los documentos se guardan como
+    modelos compactos y los listados se cachean ya serializados.
+    """
+    _enabled = False
+    _lock = threading.RLock()
+    _models = {"products": Product, "categories": Category}
+    _docs: Dict[str, Dict[str, object]] = {"products": {}, "categories": {}}
+    _last_modified: Dict[str, Optional[datetime]] = {"products": None, "categories": None}
+    _read_time: Dict[str, datetime] = {}
+    _by_category: Dict[str, set] = {}
+    _by_price: List[Tuple[float, str]] = []
+    _views: Dict[Tuple, str] = {}
+    # colección -> (update_time más reciente aún no visto, instante monotónico de la primera)
+    _pending: Dict[str, Tuple[datetime, float]] = {}
+
+    @classmethod
+    def enable(cls):
+        """Arranca la réplica; hasta completar la carga inicial se sigue leyendo de Firestore"""
+        if cls._enabled:
+            return
+        cls._enabled = True
+        ChangeFeed.add_listener(cls._apply)
+        ChangeFeed.add_restart_listener(cls._reset)
+        read_flight.add_write_listener(cls.note_write)
+        ChangeFeed.ensure_started()
+
+    # --- Mantenimiento ---------------------------------------------------
+
+    @classmethod
+    def _apply(cls, collection: str, changes, read_time):
+        with cls._lock:
+            docs = cls._docs[collection]
+            model = cls._models[collection]
+            recompute = False
+            for change in changes:
+                doc = change.document
+                previous = docs.pop(doc.id, None)
+                if previous is not None:
+                    if collection == "products":
+                        cls._unindex(previous)
+                    recompute = recompute or previous.get("updated_at") == cls._last_modified[collection]
+                if change.type.name == "REMOVED":
+                    continue
+                item = docs[doc.id] = model.from_snapshot(doc)
+                if collection == "products":
+                    cls._index(item)
+                updated_at = item.get("updated_at")
+                if isinstance(updated_at, datetime) and not recompute:
+                    current = cls._last_modified[collection]
+                    if current is None or updated_at > current:
+                        cls._last_modified[collection] = updated_at
+            if recompute:
+                stamps = [m.get("updated_at") for m in docs.values() if isinstance(m.get("updated_at"), datetime)]
+                cls._last_modified[collection] = max(stamps) if stamps else None
+
+            cls._read_time[collection] = read_time
+            cls._views.clear()
+            pending = cls._pending.get(collection)
+            if pending is not None and read_time >= pending[0]:
+                del cls._pending[collection]
+
+    @classmethod
+    def _reset(cls, collection: str):
+        """El listener se recreó: se descarta la colección hasta su nueva carga completa"""
+        with cls._lock:
+            cls._docs[collection] = {}
+            cls._last_modified[collection] = None
+            cls._read_time.pop(collection, None)
+            cls._pending.pop(collection, None)
+            if collection == "products":
+                cls._by_category.clear()
+                cls._by_price.clear()
+            cls._views.clear()
+
+    @classmethod
+    def _index(cls, product: Product):
+        cls._by_category.setdefault(product.get("category_id"), set()).add(product.id)
+        price = product.get("price")
+        if isinstance(price, (int, float)):
+            bisect.insort(cls._by_price, (price, product.id))
+
+    @classmethod
+    def _unindex(cls, product: Product):
+        category_id = product.get("category_id")
+        members = cls._by_category.get(category_id)
+        if members is not None:
+            members.discard(product.id)
+            if not members:
+                del cls._by_category[category_id]
+        price = product.get("price")
+        if isinstance(price, (int, float)):
+            position = bisect.bisect_left(cls._by_price, (price, product.id))
+            if position < len(cls._by_price) and cls._by_price[position] == (price, product.id):
+                del cls._by_price[position]
+
+    @classmethod
+    def note_write(cls, commit_times: Dict[str, datetime]):
+        """
+        Escrituras locales confirmadas: la colección queda pendiente hasta que
+        el listener entregue un snapshot con read_time posterior a su update_time.
+        """
+        if not cls._enabled:
+            return
+        with cls._lock:
+            now = time.monotonic()
+            for collection, commit_time in commit_times.items():
+                if collection not in cls._docs or commit_time is None:
+                    continue
+                read_time = cls._read_time.get(collection)
+                if read_time is not None and read_time >= commit_time:
+                    continue
+                pending = cls._pending.get(collection)
+                if pending is None:
+                    cls._pending[collection] = (commit_time, now)
+                else:
+                    cls._pending[collection] = (max(pending[0], commit_time), pending[1])
+
+    # --- Estado ----------------------------------------------------------
+
+    @classmethod
+    def staleness(cls) -> float:
+        """
+        Segundos desde la escritura más antigua de este worker aún no reflejada.
+        Solo cubre escrituras locales: las de otros workers las acota silence().
+        """
+        pending = [noted for _, noted in list(cls._pending.values())]
+        return time.monotonic() - min(pending) if pending else 0.0
+
+    @classmethod
+    def usable(cls) -> bool:
+        """False si la réplica no está cargada, el listener cayó o va retrasada"""
+        if not cls._enabled:
+            return False
+        for collection in cls._docs:
+            if collection not in cls._read_time or not ChangeFeed.is_healthy(collection):
+                return False
+        if Config.REPLICA_MAX_SILENCE > 0 and cls.silence() > Config.REPLICA_MAX_SILENCE:
+            return False
+        return cls.staleness() <= Config.REPLICA_MAX_LAG
+
+    @classmethod
+    def silence(cls) -> float:
+        """Segundos desde la última señal de vida del listener más callado"""
+        return max(ChangeFeed.silence(collection) or 0.0 for collection in cls._docs)
+
+    @classmethod
+    def annotate(cls, response):
+        """
+        Cabeceras de la réplica:
+        - X-Replica-Read-Time: read_time del último snapshot con cambios aplicado
+          (instante del último cambio visto, no un punto de frescura).
+        - X-Replica-Staleness: desfase de las escrituras de este worker aún no vistas.
+        - X-Replica-Silence: segundos sin señales del listener; acota el retraso
+          respecto a escrituras de otros workers o procesos.
+        """
+        read_time = min(cls._read_time.values())
+        response.headers["X-Replica-Read-Time"] = read_time.isoformat()
+        response.headers["X-Replica-Staleness"] = f"{cls.staleness():.3f}"
+        response.headers["X-Replica-Silence"] = f"{cls.silence():.3f}"
+        return response
+
+    @classmethod
+    def collection_version(cls, *collections: str) -> Tuple[str, Optional[datetime]]:
+        """Misma versión que SyncService.collection_version, sin leer Firestore"""
+        with cls._lock:
+            versions = []
+            last_modified = None
+            for collection in collections:
+                modified = cls._last_modified[collection]
+                versions.append(SyncService.version_of(collection, len(cls._docs[collection]), modified))
+                if modified is not None and (last_modified is None or modified > last_modified):
+                    last_modified = modified
+            return ":".join(versions), last_modified
+
+    # --- Lecturas --------------------------------------------------------
+
+    @classmethod
+    def _fallback_category(cls, product: Product) -> Optional[Dict]:
+        """Copia de la categoría para productos anteriores a la migración 1.3"""
+        if product.get("category") is not None:
+            return None
+        category = cls._docs["categories"].get(product.get("category_id"))
+        if category is None:
+            return None
+        return {"id": category.id, "name": category.get("name")}
+
+    @classmethod
+    def list_products(cls, include_category: bool = False, category_id: Optional[str] = None,
+                      sort: Optional[str] = None) -> str:
+        """Listado ya serializado a JSON"""
+        key = ("products", include_category, category_id, sort)
+        with cls._lock:
+            view = cls._views.get(key)
+            if view is not None:
+                return view
+            docs = cls._docs["products"]
+            if sort == "price":
+                ids = [pid for _, pid in cls._by_price]
+                if category_id is not None:
+                    members = cls._by_category.get(category_id, set())
+                    ids = [pid for pid in ids if pid in members]
+            elif category_id is not None:
+                ids = sorted(cls._by_category.get(category_id, ()))
+            else:
+                ids = sorted(docs)
+            parts = []
+            for pid in ids:
+                product = docs[pid]
+                fallback = cls._fallback_category(product) if include_category else None
+                parts.append(product.to_json(include_category, fallback))
+            view = cls._views[key] = "[" + ",".join(parts) + "]"
+            return view
+
+    @classmethod
+    def get_product(cls, product_id: str, include_category: bool = False) -> Optional[Tuple[Dict, datetime]]:
+        with cls._lock:
+            product = cls._docs["products"].get(product_id)
+            if product is None:
+                return None
+            product_data = product.to_dict(include_category)
+            if include_category:
+                fallback = cls._fallback_category(product)
+                if fallback is not None:
+                    product_data["category"] = fallback
+            return product_data, product.update_time
+
+    @classmethod
+    def get_many(cls, product_ids: List[str], include_category: bool = False) -> List[Dict]:
+        """Como ProductService.get_many, desde la réplica"""
+        products = []
+        with cls._lock:
+            for product_id in product_ids:
+                entry = cls.get_product(product_id, include_category)
+                products.append(entry[0] if entry is not None else {"id": product_id, "missing": True})
+        return products
+
+    @classmethod
+    def list_categories(cls, include_products: bool = False) -> str:
+        """Listado ya serializado a JSON"""
+        key = ("categories", include_products)
+        with cls._lock:
+            view = cls._views.get(key)
+            if view is not None:
+                return view
+            products = cls._docs["products"]
+            parts = []
+            for category_id, category in sorted(cls._docs["categories"].items()):
+                members = None
+                if include_products:
+                    members = [products[pid] for pid in sorted(cls._by_category.get(category_id, ()))]
+                parts.append(category.to_json(members))
+            view = cls._views[key] = "[" + ",".join(parts) + "]"
+            return view
+
+    @classmethod
+    def get_category(cls, category_id: str) -> Optional[Tuple[Dict, datetime]]:
+        with cls._lock:
+            category = cls._docs["categories"].get(category_id)
+            if category is None:
+                return None
+            return category.to_dict(), category.update_time
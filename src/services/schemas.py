@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, Any
 from firebase_admin import firestore
 import re
@@ -84,4 +84,17 @@ def is_strong_password(password: str) -> bool:
         return False
     if not re.search(r"\d", password):
         return False
-    return True
\ No newline at end of file
+    return True
+
+def parse_timestamp(value: str) -> datetime:
+    """Interpreta un timestamp ISO 8601 o epoch en segundos (UTC si no trae zona)"""
+    try:
+        parsed = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Timestamp inválido: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
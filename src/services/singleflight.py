@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from ..config import Config
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa lecturas idénticas concurrentes del mismo worker: la primera
+    ejecuta la consulta y las demás esperan y comparten su resultado.
+    Opcionalmente el resultado se reutiliza durante `ttl` segundos.
+
+    Los resultados se comparten entre peticiones: no deben modificarse.
+    """
+
+    def __init__(self, ttl: float = 0.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._calls = {}
+        self._cache: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_listeners = []
+
+    def add_write_listener(self, callback: Callable[[Dict[str, datetime]], None]):
+        """`callback(commit_times)` se llama en cada forget() que informa de escrituras confirmadas"""
+        self._write_listeners.append(callback)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[1] > time.monotonic():
+                    return cached[0]
+                del self._cache[key]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            # También Timeout / GreenletExit de gevent: los seguidores no deben recibir None
+            call.error = e if isinstance(e, Exception) else RuntimeError(
+                f"La lectura compartida se interrumpió: {type(e).__name__}"
+            )
+            raise
+        finally:
+            with self._lock:
+                # Puede haber sido descartada por forget() mientras se ejecutaba
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                    if call.error is None and self.ttl > 0:
+                        self._remember(key, call.result)
+            call.event.set()
+        return call.result
+
+    def _remember(self, key: Hashable, result: Any):
+        self._cache[key] = (result, time.monotonic() + self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def forget(self, commit_times: Optional[Dict[str, datetime]] = None):
+        """
+        Invalida caché y lecturas en curso tras una escritura local.
+        `commit_times`: colección -> update_time más reciente de lo escrito.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._calls.clear()
+        if commit_times:
+            for callback in self._write_listeners:
+                callback(commit_times)
+
+
+class CommitTimes:
+    """Acumula por colección el update_time más reciente de escrituras confirmadas (p. ej. en callbacks de BulkWriter)"""
+
+    def __init__(self):
+        self.times: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def add(self, collection: str, update_time: Optional[datetime]):
+        if update_time is None:
+            return
+        with self._lock:
+            current = self.times.get(collection)
+            if current is None or update_time > current:
+                self.times[collection] = update_time
+
+
+# Instancia compartida por los servicios de lectura del catálogo
+read_flight = SingleFlight(ttl=Config.SINGLE_FLIGHT_TTL, max_entries=Config.SINGLE_FLIGHT_MAX_ENTRIES)
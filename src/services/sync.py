@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, Query
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from .firestore_db import get_firestore_client
+from .schemas import parse_timestamp
+from .singleflight import read_flight
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+def tombstones_ref(db, collection: str):
+    """Subcolección donde se registran los documentos eliminados de `collection`"""
+    return db.collection("_tombstones").document(collection).collection("items")
+
+
+def record_tombstone(batch, db, collection: str, doc_id: str):
+    """Agrega al batch (o BulkWriter) la marca de borrado de un documento"""
+    batch.set(tombstones_ref(db, collection).document(doc_id), {
+        "id": doc_id,
+        "deleted_at": SERVER_TIMESTAMP
+    })
+
+
+def _encode_cursor(cursor: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(token: Optional[str]) -> Dict:
+    if not token:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+class SyncService:
+    """Sincronización incremental: cambios y borrados desde un instante dado"""
+    _db = None
+
+    @classmethod
+    def _get_db(cls):
+        if cls._db is None:
+            cls._db = get_firestore_client()
+        return cls._db
+
+    @classmethod
+    def _page(cls, query, field: str, position: Optional[Tuple[str, str]], limit: int):
+        """Lee una página ordenada por (field, __name__) a partir de `position`"""
+        query = query.order_by(field).order_by("__name__")
+        if position:
+            timestamp, doc_path = position
+            query = query.start_after({
+                field: parse_timestamp(timestamp),
+                "__name__": cls._get_db().document(doc_path)
+            })
+        docs = list(query.limit(limit + 1).stream())
+        has_more = len(docs) > limit
+        return docs[:limit], has_more
+
+    @classmethod
+    def changes_since(cls, collection: str, since: datetime, cursor: Optional[str] = None,
+                      limit: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """
+        Devuelve los documentos modificados y eliminados después de `since`.
+        El coste en lecturas es proporcional a los cambios, no al tamaño de la colección.
+        `limit` acota el total de la página: los borrados usan lo que dejen los modificados.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        state = _decode_cursor(cursor)
+        db = cls._get_db()
+        # El sync_token se arrastra entre páginas para que el de la última sea el máximo
+        latest = parse_timestamp(state["latest"]) if state.get("latest") else since
+
+        streams = (
+            ("items", db.collection(collection), "updated_at"),
+            ("deleted", tombstones_ref(db, collection), "deleted_at"),
+        )
+        results = {"items": [], "deleted": []}
+        remaining = limit
+        for key, collection_ref, field in streams:
+            position = state.get(key)
+            if position == "done" or remaining == 0:
+                continue
+            query = collection_ref.where(filter=FieldFilter(field, ">", since))
+            docs, has_more = cls._page(query, field, position, remaining)
+            remaining -= len(docs)
+            for doc in docs:
+                data = doc.to_dict()
+                if key == "items":
+                    results[key].append({"id": doc.id, **data})
+                else:
+                    results[key].append({"id": doc.id, "deleted_at": data[field]})
+                latest = max(latest, data[field])
+            state[key] = [docs[-1].get(field).isoformat(), docs[-1].reference.path] if has_more else "done"
+
+        has_more = state.get("items") != "done" or state.get("deleted") != "done"
+        state["latest"] = latest.isoformat()
+        return {
+            "items": results["items"],
+            "deleted": results["deleted"],
+            "has_more": has_more,
+            "next_cursor": _encode_cursor(state) if has_more else None,
+            "sync_token": latest.isoformat()
+        }
+
+    @classmethod
+    def collection_version(cls, collection: str) -> Tuple[str, Optional[datetime]]:
+        """
+        Versión barata de una colección: número de documentos (agregación) más el
+        `updated_at` más reciente. Cambia con cualquier alta, baja o modificación.
+        """
+        return read_flight.do((f"{collection}:version",), lambda: cls._load_version(collection))
+
+    @classmethod
+    def _load_version(cls, collection: str) -> Tuple[str, Optional[datetime]]:
+        collection_ref = cls._get_db().collection(collection)
+        count = collection_ref.count().get()[0][0].value
+        latest_docs = collection_ref.order_by("updated_at", direction=Query.DESCENDING).limit(1).get()
+        last_modified = latest_docs[0].get("updated_at") if latest_docs else None
+        return cls.version_of(collection, count, last_modified), last_modified
+
+    @staticmethod
+    def version_of(collection: str, count: int, last_modified: Optional[datetime]) -> str:
+        """Misma versión tanto si se calcula en Firestore como desde la réplica en memoria"""
+        stamp = last_modified.isoformat() if last_modified else ""
+        return hashlib.sha1(f"{collection}:{count}:{stamp}".encode("utf-8")).hexdigest()
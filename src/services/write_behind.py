@@ -0,0 +1,209 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from google.rpc import code_pb2
+
+from ..config import Config
+from .product_service import ProductService
+from .singleflight import CommitTimes, read_flight
+
+logger = logging.getLogger(__name__)
+
+WRITABLE_FIELDS = ("name", "price", "category_id", "description")
+RETRYABLE_CODES = (code_pb2.UNAVAILABLE, code_pb2.ABORTED, code_pb2.DEADLINE_EXCEEDED,
+                   code_pb2.RESOURCE_EXHAUSTED, code_pb2.INTERNAL)
+
+
+class BufferFullError(Exception):
+    """El buffer está lleno y el flush no da abasto"""
+
+
+class WriteBehindBuffer:
+    """
+    Buffer de escritura diferida para actualizaciones frecuentes de productos.
+    Las actualizaciones se aceptan al instante, se fusionan por documento
+    (gana la última escritura de cada campo) y se envían a Firestore en lotes
+    cada WRITE_BEHIND_INTERVAL segundos o cuando el buffer se llena.
+    """
+    _pending: Dict[str, Dict] = {}
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _wake = threading.Event()
+    _thread = None
+    # Flushes fallidos por producto; al agotar WRITE_BEHIND_MAX_FLUSHES pasa a `_dead_letter`
+    _attempts: Dict[str, int] = {}
+    _dead_letter = deque(maxlen=Config.WRITE_BEHIND_DEAD_LETTER)
+    _metrics = {
+        "accepted": 0,
+        "merged": 0,
+        "written": 0,
+        "failed": 0,
+        "requeued": 0,
+        "flushes": 0,
+        "last_flush_at": None,
+        "last_flush_seconds": 0.0,
+    }
+
+    @classmethod
+    def _ensure_started(cls):
+        if cls._thread is None or not cls._thread.is_alive():
+            with cls._lock:
+                if cls._thread is None or not cls._thread.is_alive():
+                    cls._thread = threading.Thread(target=cls._loop, name="write-behind", daemon=True)
+                    cls._thread.start()
+
+    @classmethod
+    def _loop(cls):
+        while True:
+            cls._wake.wait(Config.WRITE_BEHIND_INTERVAL)
+            cls._wake.clear()
+            try:
+                cls.flush()
+            except Exception as e:
+                logger.error(f"Error en flush del buffer de escritura: {str(e)}")
+
+    @classmethod
+    def enqueue(cls, product_id: str, data: Dict) -> List[str]:
+        """Valida y acepta una actualización parcial; devuelve los campos pendientes del producto"""
+        changes = {k: v for k, v in data.items() if k in WRITABLE_FIELDS}
+        if not changes:
+            raise ValueError(f"Se esperaba al menos uno de: {', '.join(WRITABLE_FIELDS)}")
+        ProductService.check_product_fields(changes, partial=True)
+        # Un ID con '/' haría fallar la lectura por lotes de categorías de todo el flush
+        if "/" in changes.get("category_id", ""):
+            raise ValueError(f"category_id inválido: {changes['category_id']!r}")
+
+        cls._ensure_started()
+        with cls._lock:
+            if product_id not in cls._pending and len(cls._pending) >= Config.WRITE_BEHIND_MAX_DOCS * 2:
+                cls._wake.set()
+                raise BufferFullError("Buffer de escritura lleno, intente más tarde")
+            if product_id in cls._pending:
+                cls._metrics["merged"] += 1
+            merged = cls._pending.setdefault(product_id, {})
+            merged.update(changes)
+            cls._metrics["accepted"] += 1
+            if len(cls._pending) >= Config.WRITE_BEHIND_MAX_DOCS:
+                cls._wake.set()
+            return sorted(merged)
+
+    @classmethod
+    def _requeue(cls, unsent: Dict[str, Dict]):
+        """
+        Devuelve al buffer lo no escrito; los campos aceptados después tienen
+        prioridad. Tras WRITE_BEHIND_MAX_FLUSHES intentos el cambio se descarta.
+        """
+        with cls._lock:
+            for product_id, changes in unsent.items():
+                attempts = cls._attempts.get(product_id, 0) + 1
+                if attempts >= Config.WRITE_BEHIND_MAX_FLUSHES:
+                    cls._attempts.pop(product_id, None)
+                    cls._dead_letter.append({"id": product_id, "changes": changes, "failed_at": time.time()})
+                    cls._metrics["failed"] += 1
+                    logger.error(f"Escritura diferida descartada para {product_id} tras {attempts} intentos")
+                    continue
+                cls._attempts[product_id] = attempts
+                newer = cls._pending.get(product_id)
+                cls._pending[product_id] = {**changes, **newer} if newer else changes
+                cls._metrics["requeued"] += 1
+
+    @classmethod
+    def flush(cls) -> int:
+        """Envía a Firestore todas las actualizaciones pendientes; devuelve los documentos escritos"""
+        with cls._flush_lock:
+            with cls._lock:
+                pending, cls._pending = cls._pending, {}
+            if not pending:
+                return 0
+
+            # Lo que no llegue a confirmarse (error o excepción) vuelve al buffer
+            unsent = dict(pending)
+            try:
+                return cls._write(pending, unsent)
+            finally:
+                if unsent:
+                    cls._requeue(unsent)
+
+    @classmethod
+    def _write(cls, pending: Dict[str, Dict], unsent: Dict[str, Dict]) -> int:
+        started = time.monotonic()
+        db = ProductService._get_db()
+
+        # Categorías inexistentes pasan a 'uncategorized', igual que en la escritura directa,
+        # y se actualiza la copia de la categoría embebida en el producto
+        category_ids = {c["category_id"] for c in pending.values() if "category_id" in c}
+        if category_ids:
+            refs = [db.collection("categories").document(cid) for cid in category_ids]
+            existing = {doc.id: doc.get("name") for doc in db.get_all(refs, field_paths=["name"]) if doc.exists}
+            if category_ids - set(existing):
+                existing.setdefault(ProductService.ensure_uncategorized(), "Uncategorized")
+            for changes in pending.values():
+                if "category_id" in changes:
+                    if changes["category_id"] not in existing:
+                        changes["category_id"] = "uncategorized"
+                    changes["category"] = ProductService.category_snapshot(
+                        changes["category_id"], existing[changes["category_id"]]
+                    )
+
+        written = [0]
+        failed = [0]
+        commits = CommitTimes()
+
+        def on_result(reference, result, bulk_writer):
+            unsent.pop(reference.id, None)
+            cls._attempts.pop(reference.id, None)
+            commits.add("products", result.update_time)
+            written[0] += 1
+
+        def on_error(failure, bulk_writer):
+            product_id = failure.operation.reference.id
+            if failure.code in RETRYABLE_CODES and failure.attempts < Config.WRITE_BEHIND_MAX_ATTEMPTS:
+                return True
+            logger.warning(f"Escritura diferida fallida para {product_id}: {failure.message}")
+            if failure.code == code_pb2.NOT_FOUND:
+                # Un producto borrado mientras estaba en el buffer se descarta
+                unsent.pop(product_id, None)
+                cls._attempts.pop(product_id, None)
+                failed[0] += 1
+            return False
+
+        writer = db.bulk_writer()
+        writer.on_write_result(on_result)
+        writer.on_write_error(on_error)
+        products_ref = db.collection("products")
+        for product_id, changes in pending.items():
+            writer.update(products_ref.document(product_id), {**changes, "updated_at": SERVER_TIMESTAMP})
+        try:
+            writer.close()
+        finally:
+            if commits.times:
+                read_flight.forget(commits.times)
+
+        with cls._lock:
+            cls._metrics["written"] += written[0]
+            cls._metrics["failed"] += failed[0]
+            cls._metrics["flushes"] += 1
+            cls._metrics["last_flush_at"] = time.time()
+            cls._metrics["last_flush_seconds"] = round(time.monotonic() - started, 4)
+        return written[0]
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            metrics = dict(cls._metrics)
+            metrics["depth"] = len(cls._pending)
+            metrics["retrying"] = len(cls._attempts)
+            metrics["dead_letter"] = list(cls._dead_letter)
+        # Actualizaciones aceptadas por cada escritura de documento en Firestore
+        documents = metrics["accepted"] - metrics["merged"]
+        metrics["coalescing_ratio"] = round(metrics["accepted"] / documents, 2) if documents else None
+        return metrics
+
+
+# Vaciar el buffer al terminar el proceso (gunicorn llama además a worker_exit)
+atexit.register(WriteBehindBuffer.flush)
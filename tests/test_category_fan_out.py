@@ -0,0 +1,159 @@
+"""
+Propagación del nombre de categoría a la copia embebida en los productos
+(CategoryService._fan_out_snapshot) contra un Firestore falso en memoria.
+"""
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from src.services import product_service
+from src.services.jobs import Job, JobRegistry
+from src.services.product_service import CategoryService, ProductService
+
+COMMIT_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data.get(field)
+
+
+class FakeDocumentRef:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self, self.db.data[self.collection].get(self.id))
+
+
+class FakeQuery:
+    def __init__(self, db, collection, field, value, limit=None, after=None):
+        self.db, self.collection, self.field, self.value = db, collection, field, value
+        self._limit, self._after = limit, after
+
+    def limit(self, count):
+        return FakeQuery(self.db, self.collection, self.field, self.value, count, self._after)
+
+    def start_after(self, snapshot):
+        return FakeQuery(self.db, self.collection, self.field, self.value, self._limit, snapshot.id)
+
+    def select(self, field_paths):
+        return self
+
+    def stream(self):
+        docs = self.db.data[self.collection]
+        ids = sorted(i for i, d in docs.items() if d.get(self.field) == self.value)
+        if self._after is not None:
+            ids = [i for i in ids if i > self._after]
+        for doc_id in ids[:self._limit]:
+            yield FakeSnapshot(FakeDocumentRef(self.db, self.collection, doc_id), docs[doc_id])
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def document(self, doc_id):
+        return FakeDocumentRef(self.db, self.name, doc_id)
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.name, field, value)
+
+
+class FakeTransaction:
+    """Misma firma de get_all que google.cloud.firestore_v1.Transaction (sin field_paths)"""
+
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+        self.commit_time = None
+
+    def get_all(self, references, retry=None, timeout=None):
+        for ref in references:
+            yield ref.get(transaction=self)
+
+    def update(self, reference, data):
+        self.writes.append((reference, data))
+
+    def commit(self):
+        for reference, data in self.writes:
+            self.db.data[reference.collection][reference.id].update(data)
+        self.commit_time = COMMIT_TIME
+
+
+class FakeDb:
+    def __init__(self, data):
+        self.data = data
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+
+def fake_transactional(fn):
+    def run(transaction, *args):
+        result = fn(transaction, *args)
+        transaction.commit()
+        return result
+    return run
+
+
+@pytest.fixture
+def fake_db():
+    db = FakeDb({
+        "categories": {"c1": {"name": "Nuevo"}},
+        "products": {
+            f"p{i}": {"name": f"P{i}", "category_id": "c1", "category": {"id": "c1", "name": "Viejo"}}
+            for i in range(5)
+        },
+    })
+    db.data["products"]["other"] = {"name": "X", "category_id": "c2", "category": {"id": "c2", "name": "Otra"}}
+    with mock.patch.object(CategoryService, "_db", db), \
+            mock.patch.object(product_service.firestore, "transactional", fake_transactional), \
+            mock.patch.object(product_service.Config, "BULK_CHUNK_SIZE", 2), \
+            mock.patch.object(JobRegistry, "persist"), \
+            mock.patch.object(product_service.read_flight, "forget") as forget:
+        db.forget = forget
+        yield db
+
+
+def test_fan_out_rewrites_embedded_category(fake_db):
+    job = Job("category_snapshot_fanout")
+    CategoryService._fan_out_snapshot(job, "c1", "Nuevo")
+
+    expected = ProductService.category_snapshot("c1", "Nuevo")
+    for doc_id in (f"p{i}" for i in range(5)):
+        product = fake_db.data["products"][doc_id]
+        assert product["category"] == expected
+        assert "updated_at" in product
+    assert fake_db.data["products"]["other"]["category"]["name"] == "Otra"
+    assert (job.processed, job.succeeded, job.errors) == (5, 5, [])
+    fake_db.forget.assert_called_with({"products": COMMIT_TIME})
+
+
+def test_fan_out_stops_when_category_was_renamed_again(fake_db):
+    job = Job("category_snapshot_fanout")
+    CategoryService._fan_out_snapshot(job, "c1", "Intermedio")
+
+    assert all(p["category"]["name"] == "Viejo"
+               for doc_id, p in fake_db.data["products"].items() if doc_id != "other")
+    assert job.succeeded == 0
+    assert len(job.errors) == 1
+    fake_db.forget.assert_not_called()